@@ -13,7 +13,9 @@ def loop(interval_minutes: int, scrape_n: int = 200, embed_limit: int = 2000):
     while True:
         try:
             run(f"python scraper.py {scrape_n} --subs cybersecurity,netsec --sleep 1.5")
+            run("python bodies.py")
             run("python preprocess.py")
+            run("python dedup.py")
             run(f"python embed.py --limit {embed_limit} --dim 128 --model_version tfidf_svd_v2")
             run("python cluster_from_embeddings.py --k 8 --limit 2000 --model_version tfidf_svd_v2")
             run("python keywords.py --model_version tfidf_svd_v2 --k 8 --topn 10")
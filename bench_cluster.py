@@ -0,0 +1,90 @@
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import pairwise_distances, silhouette_score
+from sklearn.preprocessing import normalize
+
+from spherical_kmeans import spherical_kmeans, minibatch_spherical_kmeans, closest_to_centers
+
+
+def run_kmeans(X, k):
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init="auto")
+    kmeans.fit(X)
+    # what cluster.py does afterwards for representatives
+    D = pairwise_distances(X, kmeans.cluster_centers_)
+    for c in range(k):
+        np.argsort(D[:, c])[:3]
+    return kmeans.labels_, normalize(kmeans.cluster_centers_)
+
+
+def run_spherical(X, k):
+    labels, C, _ = spherical_kmeans(X, k)
+    closest_to_centers(X, C, labels, 3)
+    return labels, C
+
+
+def run_minibatch(X, k):
+    labels, C, _ = minibatch_spherical_kmeans(X, k)
+    closest_to_centers(X, C, labels, 3)
+    return labels, C
+
+
+def mean_cosine(X, labels, C):
+    Xn = normalize(X)
+    sims = np.asarray(Xn @ C.T)[np.arange(Xn.shape[0]), labels]
+    return float(sims.mean())
+
+
+def synthetic_texts(n: int, topics: int, seed: int = 0):
+    # topic mixture corpus: each post's topic words are diluted with twice as many shared words
+    rng = np.random.RandomState(seed)
+    shared = [f"w{i}" for i in range(2000)]
+    vocab = [[f"t{t}_{i}" for i in range(300)] for t in range(topics)]
+    texts = []
+    for _ in range(n):
+        t = rng.randint(topics)
+        m = rng.randint(20, 80)
+        own = rng.zipf(1.3, m) % 300
+        words = [vocab[t][i] for i in own] + [shared[i] for i in rng.randint(0, 2000, 2 * m)]
+        texts.append(" ".join(words))
+    return texts
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, default=12)
+    ap.add_argument("--limit", type=int, default=5000)
+    ap.add_argument("--max_features", type=int, default=3000)
+    ap.add_argument("--silhouette_sample", type=int, default=3000)
+    ap.add_argument("--synthetic", action="store_true", help="generate --limit topic-mixture posts instead of reading MySQL")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        texts = synthetic_texts(args.limit, args.k)
+    else:
+        from cluster import load_posts
+        texts = [r["clean_text"] for r in load_posts(args.limit)]
+    X = TfidfVectorizer(stop_words="english", max_features=args.max_features).fit_transform(texts)
+    print(f"Benchmark on X shape={X.shape} nnz={X.nnz} k={args.k}\n")
+
+    engines = [("kmeans", run_kmeans), ("spherical", run_spherical), ("minibatch", run_minibatch)]
+    print(f"{'engine':<10} {'time_s':>8} {'peak_mb':>8} {'mean_cos':>9} {'silhouette':>10}")
+    for name, fn in engines:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        labels, C = fn(X, args.k)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        sil = silhouette_score(X, labels, metric="cosine",
+                               sample_size=min(args.silhouette_sample, X.shape[0]), random_state=42)
+        print(f"{name:<10} {elapsed:>8.2f} {peak / 1e6:>8.1f} {mean_cosine(X, labels, C):>9.4f} {sil:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
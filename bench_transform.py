@@ -0,0 +1,49 @@
+import os
+import time
+import argparse
+
+from joblib import dump
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from bench_cluster import synthetic_texts
+from parallel_transform import effective_n_jobs, parallel_transform
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200000, help="synthetic posts to transform")
+    ap.add_argument("--fit_sample", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=128)
+    ap.add_argument("--shard_size", type=int, default=5000)
+    ap.add_argument("--jobs", type=str, default="1,2,4,-1", help="comma-separated n_jobs values to time")
+    args = ap.parse_args()
+
+    texts = synthetic_texts(args.n, 12)
+    vectorizer = TfidfVectorizer(stop_words="english", max_features=5000, min_df=5, max_df=0.7)
+    X = vectorizer.fit_transform(texts[:args.fit_sample])
+    svd = TruncatedSVD(n_components=args.dim, random_state=42).fit(X)
+
+    # throwaway artifacts under models/, the only place parallel_transform loads from
+    model_version = f"bench_{os.getpid()}"
+    paths = [f"models/{model_version}_vectorizer.joblib", f"models/{model_version}_svd.joblib"]
+    os.makedirs("models", exist_ok=True)
+    dump(vectorizer, paths[0])
+    dump(svd, paths[1])
+    try:
+        print(f"Transforming {args.n} docs to dim={args.dim} on {os.cpu_count()} CPUs\n")
+        print(f"{'n_jobs':>6} {'workers':>7} {'time_s':>8} {'docs_per_s':>11} {'speedup':>8}")
+        base = None
+        for j in (int(x) for x in args.jobs.split(",")):
+            t0 = time.perf_counter()
+            parallel_transform(texts, model_version, n_jobs=j, shard_size=args.shard_size)
+            elapsed = time.perf_counter() - t0
+            base = base or elapsed
+            print(f"{j:>6} {effective_n_jobs(j):>7} {elapsed:>8.2f} {args.n / elapsed:>11.0f} {base / elapsed:>7.2f}x")
+    finally:
+        for p in paths:
+            os.remove(p)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bs4 import BeautifulSoup
+
+from db import get_conn
+from preprocess import clean_text
+from dedup import forget_posts
+from scraper import UA, BASE
+
+
+CACHE_DIR = Path("cache/bodies")
+
+_local = threading.local()
+
+
+class RateLimiter:
+    # one request slot every `min_interval` seconds, shared by all workers,
+    # so the pool overlaps latency without hitting reddit harder than the scraper
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_at)
+            self.next_at = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def get_session() -> requests.Session:
+    # one keep-alive session per worker thread
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        _local.session.headers["User-Agent"] = UA
+    return _local.session
+
+
+LOAD_PENDING_SQL = """
+    SELECT id, post_id, title, body_fetched_at
+    FROM posts
+    WHERE body_fetched_at IS NULL
+      AND post_url LIKE %s
+      AND (is_ad IS NULL OR is_ad = 0)
+    ORDER BY id DESC
+    LIMIT %s
+"""
+
+REVALIDATE_SQL = """
+    SELECT id, post_id, title, body_fetched_at
+    FROM posts
+    WHERE body_fetched_at < NOW() - INTERVAL %s HOUR
+      AND created_at > NOW() - INTERVAL 1 DAY
+      AND post_url LIKE %s
+      AND (is_ad IS NULL OR is_ad = 0)
+    ORDER BY id DESC
+    LIMIT %s
+"""
+
+
+def load_pending(limit: int, revalidate_hours: float = 0):
+    # never-fetched posts first; optionally, still-fresh posts (where edits happen) for revalidation
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(LOAD_PENDING_SQL, ("%/comments/%", limit))
+    rows = cur.fetchall()
+    if revalidate_hours > 0 and len(rows) < limit:
+        cur.execute(REVALIDATE_SQL, (revalidate_hours, "%/comments/%", limit - len(rows)))
+        rows.extend(cur.fetchall())
+    cur.close()
+    conn.close()
+    return rows
+
+
+def cache_path(post_id: str) -> Path:
+    return CACHE_DIR / f"{post_id}.json"
+
+
+def read_cache(post_id: str) -> Optional[Dict]:
+    p = cache_path(post_id)
+    if not p.exists():
+        return None
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(post_id: str, entry: Dict):
+    p = cache_path(post_id)
+    tmp = p.with_suffix(f".{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp, p)
+
+
+def parse_body(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    md = soup.select_one("div.thing.link div.expando div.usertext-body div.md")
+    if md is None:
+        md = soup.select_one("div.expando div.md")
+    return md.get_text(" ", strip=True) if md else ""
+
+
+def fetch_body(post_id: str, base: str, revalidate: bool, limiter: RateLimiter) -> Tuple[str, str]:
+    cached = read_cache(post_id)
+    now = time.time()
+    if cached and not revalidate:
+        return cached.get("body", ""), "cached"
+
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    limiter.wait()
+    r = get_session().get(f"{base}/comments/{post_id}/", headers=headers, timeout=30)
+
+    if r.status_code == 304 and cached:
+        cached["fetched_at"] = now
+        write_cache(post_id, cached)
+        return cached.get("body", ""), "not_modified"
+
+    if 400 <= r.status_code < 500 and r.status_code != 429:
+        # deleted, private or quarantined: permanent, so the post is marked fetched with no body
+        return "", "gone"
+
+    r.raise_for_status()
+    body = parse_body(r.text)
+    write_cache(post_id, {
+        "body": body,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "fetched_at": now,
+    })
+    return body, "fetched"
+
+
+def update_bodies(updates, fetched_ids):
+    if not updates and not fetched_ids:
+        return
+    conn = get_conn()
+    cur = conn.cursor()
+    if updates:
+        cur.executemany("UPDATE posts SET body=%s, clean_text=%s WHERE id=%s", updates)
+    if fetched_ids:
+        # title-only posts are marked too, so they leave the pending set for good
+        cur.executemany("UPDATE posts SET body_fetched_at=NOW() WHERE id=%s", [(i,) for i in fetched_ids])
+    conn.commit()
+    cur.close()
+    conn.close()
+    # a post signed on its title alone must be signed again now that it has a body
+    forget_posts([pid for _, _, pid in updates])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit", type=int, default=500, help="max posts to fetch bodies for")
+    ap.add_argument("--workers", type=int, default=4, help="concurrent fetch workers")
+    ap.add_argument("--min_interval", type=float, default=1.2,
+                    help="seconds between requests across all workers (matches the scraper's pacing)")
+    ap.add_argument("--revalidate_hours", type=float, default=0,
+                    help="also revalidate posts under a day old whose body is older than this (0 = off)")
+    ap.add_argument("--base", type=str, default=BASE, help="site root, e.g. a local stub server")
+    args = ap.parse_args()
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    rows = load_pending(args.limit, args.revalidate_hours)
+    if not rows:
+        print("No posts need bodies.")
+        return
+
+    limiter = RateLimiter(args.min_interval)
+
+    def work(r):
+        try:
+            revalidate = r["body_fetched_at"] is not None
+            return r, fetch_body(r["post_id"], args.base, revalidate, limiter)
+        except Exception as e:
+            print(f"[{r['post_id']}] Error: {e}")
+            return r, ("", "error")
+
+    stats: Dict[str, int] = {}
+    updates, fetched_ids = [], []
+    with ThreadPoolExecutor(max_workers=args.workers) as ex:
+        for r, (body, status) in ex.map(work, rows):
+            stats[status] = stats.get(status, 0) + 1
+            if status == "error":
+                continue
+            fetched_ids.append(r["id"])
+            if body and status != "not_modified":
+                text = clean_text(f"{r.get('title', '')} {body}")
+                updates.append((body, text, r["id"]))
+
+    update_bodies(updates, fetched_ids)
+    print(f"Bodies: {len(updates)} updated out of {len(rows)} posts. {stats}")
+
+
+if __name__ == "__main__":
+    main()
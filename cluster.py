@@ -4,6 +4,8 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
 from sklearn.metrics import pairwise_distances
 from db import get_conn
+from dedup import propagate_cluster_ids
+from spherical_kmeans import spherical_kmeans, minibatch_spherical_kmeans, closest_to_centers
 
 
 def load_posts(limit: int):
@@ -11,11 +13,13 @@ def load_posts(limit: int):
     cur = conn.cursor(dictionary=True)
     cur.execute(
         """
-        SELECT id, clean_text, title
-        FROM posts
-        WHERE clean_text IS NOT NULL AND clean_text != ''
-          AND (is_ad IS NULL OR is_ad = 0)
-        ORDER BY id DESC
+        SELECT p.id, p.clean_text, p.title
+        FROM posts p
+        LEFT JOIN post_duplicates d ON d.post_row_id = p.id
+        WHERE p.clean_text IS NOT NULL AND p.clean_text != ''
+          AND (p.is_ad IS NULL OR p.is_ad = 0)
+          AND d.post_row_id IS NULL
+        ORDER BY p.id DESC
         LIMIT %s
         """,
         (limit,),
@@ -36,11 +40,13 @@ def update_cluster_ids(ids, labels):
     conn.close()
 
 
-def print_cluster_representatives(texts, titles, labels, centers, X, topn=3):
-    D = pairwise_distances(X, centers)  
-    k = centers.shape[0]
-    for c in range(k):
-        idx = np.argsort(D[:, c])[:topn]
+def print_cluster_representatives(texts, titles, labels, centers, X, topn=3, metric="euclidean"):
+    if metric == "cosine":
+        reps = closest_to_centers(X, centers, labels, topn)
+    else:
+        D = pairwise_distances(X, centers)
+        reps = [(c, np.argsort(D[:, c])[:topn], None) for c in range(centers.shape[0])]
+    for c, idx, _ in reps:
         print(f"\nCluster {c} (top {topn} closest to centroid)")
         for j, i in enumerate(idx, 1):
             print(f"{j}. {titles[i][:120]}")
@@ -52,6 +58,8 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--k", type=int, default=5, help="number of clusters")
     ap.add_argument("--limit", type=int, default=5000, help="max docs to cluster")
+    ap.add_argument("--engine", choices=["kmeans", "spherical", "minibatch"], default="kmeans",
+                    help="kmeans = Euclidean KMeans; spherical/minibatch = cosine k-means on sparse TF-IDF")
     args = ap.parse_args()
 
     rows = load_posts(args.limit)
@@ -68,11 +76,17 @@ def main():
     vectorizer = TfidfVectorizer(stop_words="english", max_features=3000)
     X = vectorizer.fit_transform(texts)
 
-    kmeans = KMeans(n_clusters=args.k, random_state=42, n_init="auto")
-    kmeans.fit(X)
+    if args.engine == "spherical":
+        labels, centers, _ = spherical_kmeans(X, args.k)
+    elif args.engine == "minibatch":
+        labels, centers, _ = minibatch_spherical_kmeans(X, args.k)
+    else:
+        kmeans = KMeans(n_clusters=args.k, random_state=42, n_init="auto")
+        kmeans.fit(X)
+        labels, centers = kmeans.labels_, kmeans.cluster_centers_
 
-    labels = kmeans.labels_
     update_cluster_ids(ids, labels)
+    propagate_cluster_ids()
 
     print("Clusters assigned and saved to DB.")
 
@@ -80,9 +94,10 @@ def main():
         texts=texts,
         titles=titles,
         labels=labels,
-        centers=kmeans.cluster_centers_,
+        centers=centers,
         X=X,
         topn=3,
+        metric="euclidean" if args.engine == "kmeans" else "cosine",
     )
 
 
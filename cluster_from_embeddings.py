@@ -1,23 +1,31 @@
 import json
 import argparse
 import numpy as np
+from scipy.optimize import linear_sum_assignment
 from sklearn.cluster import KMeans
 from sklearn.metrics import pairwise_distances
 from db import get_conn
+from migrations import migrate
+from dedup import load_duplicate_pairs, propagate_cluster_ids
+from trends import apply_label_deltas, load_previous
+from snapshot import load_snapshot
 
 
+LOAD_EMBEDDINGS_SQL = """
+    SELECT e.post_row_id, e.vector_json, p.title
+    FROM embeddings e
+    JOIN posts p ON e.post_row_id = p.id
+    LEFT JOIN post_duplicates d ON d.post_row_id = e.post_row_id
+    WHERE e.model_version = %s AND d.post_row_id IS NULL
+    ORDER BY e.post_row_id DESC
+    LIMIT %s
+"""
+
 def load_embeddings(limit: int, model_version: str):
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
 
-    cur.execute("""
-        SELECT e.post_row_id, e.vector_json, p.title
-        FROM embeddings e
-        JOIN posts p ON e.post_row_id = p.id
-        WHERE e.model_version = %s
-        ORDER BY e.post_row_id DESC
-        LIMIT %s
-    """, (model_version, limit))
+    cur.execute(LOAD_EMBEDDINGS_SQL, (model_version, limit))
 
     rows = cur.fetchall()
     cur.close()
@@ -33,6 +41,16 @@ def load_embeddings(limit: int, model_version: str):
     return ids, X, titles
 
 
+def load_embeddings_from_snapshot(path: str, limit: int, model_version: str):
+    snap = load_snapshot(path, model_version=model_version)
+    # duplicates are skipped here just like in load_embeddings
+    keep = np.where(snap["canonical_row_id"] < 0)[0][:limit]
+    ids = snap["post_row_id"][keep].tolist()
+    X = snap["embedding"][keep]
+    titles = [snap["title"][i] for i in keep]
+    return ids, X, titles
+
+
 def update_cluster_ids(ids, labels):
     conn = get_conn()
     cur = conn.cursor()
@@ -43,29 +61,127 @@ def update_cluster_ids(ids, labels):
     conn.close()
 
 
+def align_to_previous(centers, labels, prev_labels, k: int):
+    # KMeans numbers its clusters arbitrarily on every fit, and embed.py refits the basis each
+    # cycle, so centers from different runs are not comparable. Match on membership instead:
+    # each new cluster takes the previous id that most of the same posts carried.
+    known = (prev_labels >= 0) & (prev_labels < k)
+    if not known.any():
+        return centers, labels
+    M = np.zeros((k, k), dtype=np.int64)
+    np.add.at(M, (labels[known], prev_labels[known]), 1)
+    new_idx, old_idx = linear_sum_assignment(-M)
+    perm = np.empty(k, dtype=int)
+    perm[new_idx] = old_idx
+    aligned = np.empty_like(centers)
+    aligned[perm] = centers
+    return aligned, perm[labels]
+
+
+def previous_labels(model_version: str, k: int, ids):
+    prev = {int(r["id"]): r["cluster_id"] for r in load_previous(model_version, k, [int(i) for i in ids])}
+    return np.array([-1 if prev.get(int(i)) is None else int(prev[int(i)]) for i in ids], dtype=int)
+
+
+def save_centroids(model_version: str, k: int, centers, labels):
+    # warm start for stream.py, in the basis of the embeddings just clustered
+    counts = np.bincount(labels, minlength=k)
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO cluster_centroids (model_version, k, cluster_id, centroid, n)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE centroid=VALUES(centroid), n=VALUES(n)
+    """, [(model_version, k, c, centers[c].astype(np.float64).tobytes(), int(counts[c])) for c in range(k)])
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def with_duplicates(ids, labels):
+    # near-duplicates are not clustered themselves but still count towards their canonical's trend
+    label_of = {int(pid): int(lab) for pid, lab in zip(ids, labels)}
+    pairs = load_duplicate_pairs(list(label_of))
+    return (list(label_of) + [d for d, _ in pairs],
+            list(label_of.values()) + [label_of[c] for _, c in pairs])
+
+
+def select_representatives(D, labels, topn: int):
+    out = []
+    for c in range(D.shape[1]):
+        members = np.where(labels == c)[0]
+        if len(members) == 0:
+            out.append((c, members, D[members, c]))
+            continue
+        d = D[members, c]
+        n = min(topn, len(members))
+        # partial sort: O(n) selection, then order only the top-n
+        part = np.argpartition(d, n - 1)[:n]
+        part = part[np.argsort(d[part])]
+        out.append((c, members[part], d[part]))
+    return out
+
+
+def save_representatives(model_version: str, k: int, ids, reps):
+    conn = get_conn()
+    cur = conn.cursor()
+    # one transaction, so query.py never sees the table between the DELETE and the INSERT
+    conn.start_transaction()
+    cur.execute(
+        "DELETE FROM cluster_representatives WHERE model_version=%s AND k=%s",
+        (model_version, k),
+    )
+    rows = []
+    for c, idx, dist in reps:
+        for rank, (i, d) in enumerate(zip(idx, dist), 1):
+            rows.append((model_version, k, int(c), rank, int(ids[i]), float(d)))
+    if rows:
+        cur.executemany("""
+            INSERT INTO cluster_representatives (model_version, k, cluster_id, rank_no, post_row_id, distance)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, rows)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--k", type=int, default=8)
     parser.add_argument("--limit", type=int, default=5000)
     parser.add_argument("--model_version", type=str, default="tfidf_svd_v2")
     parser.add_argument("--topn", type=int, default=3)
+    parser.add_argument("--store_topn", type=int, default=10, help="representatives persisted per cluster")
+    parser.add_argument("--snapshot", type=str, default=None, help="read embeddings from a snapshot instead of MySQL")
     args = parser.parse_args()
 
-    ids, X, titles = load_embeddings(args.limit, args.model_version)
+    migrate()
+
+    if args.snapshot:
+        ids, X, titles = load_embeddings_from_snapshot(args.snapshot, args.limit, args.model_version)
+    else:
+        ids, X, titles = load_embeddings(args.limit, args.model_version)
     print(f"Loaded {len(ids)} embeddings. Dim={X.shape[1]} (model_version={args.model_version})")
 
     kmeans = KMeans(n_clusters=args.k, random_state=42, n_init="auto")
     kmeans.fit(X)
 
-    labels = kmeans.labels_
+    prev = previous_labels(args.model_version, args.k, ids)
+    centers, labels = align_to_previous(kmeans.cluster_centers_, kmeans.labels_, prev, args.k)
+    save_centroids(args.model_version, args.k, centers, labels)
+
     update_cluster_ids(ids, labels)
-    print("Cluster IDs updated.")
-    
-    D = pairwise_distances(X, kmeans.cluster_centers_)
-    for c in range(args.k):
-        idx = np.argsort(D[:, c])[:args.topn]
+    propagate_cluster_ids()
+    changed = apply_label_deltas(args.model_version, args.k, *with_duplicates(ids, labels))
+    print(f"Cluster IDs updated. {changed} label changes folded into cluster_trends.")
+
+    D = pairwise_distances(X, centers)
+    reps = select_representatives(D, labels, max(args.topn, args.store_topn))
+    save_representatives(args.model_version, args.k, ids, reps)
+
+    for c, idx, _ in reps:
         print(f"\nCluster {c}")
-        for i in idx:
+        for i in idx[:args.topn]:
             print(titles[i])
             print("----")
 
@@ -0,0 +1,258 @@
+import zlib
+import hashlib
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from db import get_conn
+from migrations import migrate
+
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text: str) -> np.ndarray:
+    s = " ".join((text or "").lower().split())
+    if len(s) <= SHINGLE:
+        grams = {s}
+    else:
+        grams = {s[i:i + SHINGLE] for i in range(len(s) - SHINGLE + 1)}
+    return np.array([zlib.crc32(g.encode("utf-8")) for g in grams], dtype=np.uint64)
+
+
+def minhash(text: str) -> np.ndarray:
+    hv = shingles(text)
+    # (a*x + b) mod p, wrapping in uint64 like the usual MinHash implementations
+    phv = ((np.outer(hv, _A) + _B) % _PRIME) & _MAX_HASH
+    return phv.min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[str]:
+    keys = []
+    for b in range(BANDS):
+        h = hashlib.blake2b(sig[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8, salt=bytes([b]))
+        keys.append(h.hexdigest())
+    return keys
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+NEW_POSTS_SQL = """
+    SELECT p.id, p.clean_text
+    FROM posts p
+    LEFT JOIN post_minhash m ON m.post_row_id = p.id
+    WHERE m.post_row_id IS NULL
+      AND p.clean_text IS NOT NULL AND p.clean_text != ''
+      AND (p.is_ad IS NULL OR p.is_ad = 0)
+    ORDER BY p.id ASC
+    LIMIT %s
+"""
+
+# IN lists are filled in with `.format(marks=...)`
+CANDIDATES_SQL = "SELECT bucket, post_row_id FROM lsh_buckets WHERE bucket IN ({marks})"
+SIGNATURES_SQL = "SELECT post_row_id, signature FROM post_minhash WHERE post_row_id IN ({marks})"
+DUPLICATE_PAIRS_SQL = "SELECT post_row_id, canonical_row_id FROM post_duplicates WHERE canonical_row_id IN ({marks})"
+
+
+def load_new_posts(limit: int):
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(NEW_POSTS_SQL, (limit,))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+
+def lookup_candidates(keys: List[str]) -> Dict[str, List[int]]:
+    out: Dict[str, List[int]] = {}
+    if not keys:
+        return out
+    conn = get_conn()
+    cur = conn.cursor()
+    for i in range(0, len(keys), 1000):
+        chunk = keys[i:i + 1000]
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(CANDIDATES_SQL.format(marks=marks), chunk)
+        for bucket, pid in cur.fetchall():
+            out.setdefault(bucket, []).append(int(pid))
+    cur.close()
+    conn.close()
+    return out
+
+
+def load_signatures(ids: List[int]) -> Dict[int, np.ndarray]:
+    out: Dict[int, np.ndarray] = {}
+    if not ids:
+        return out
+    conn = get_conn()
+    cur = conn.cursor()
+    for i in range(0, len(ids), 1000):
+        chunk = ids[i:i + 1000]
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(SIGNATURES_SQL.format(marks=marks), chunk)
+        for pid, blob in cur.fetchall():
+            out[int(pid)] = np.frombuffer(bytes(blob), dtype=np.uint32)
+    cur.close()
+    conn.close()
+    return out
+
+
+def save_batch(sigs, buckets, dups):
+    conn = get_conn()
+    cur = conn.cursor()
+    if sigs:
+        cur.executemany(
+            "INSERT IGNORE INTO post_minhash (post_row_id, signature) VALUES (%s, %s)",
+            [(pid, sig.tobytes()) for pid, sig in sigs],
+        )
+    if buckets:
+        cur.executemany("INSERT IGNORE INTO lsh_buckets (bucket, post_row_id) VALUES (%s, %s)", buckets)
+    if dups:
+        cur.executemany(
+            """
+            INSERT INTO post_duplicates (post_row_id, canonical_row_id, similarity)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+              canonical_row_id=VALUES(canonical_row_id),
+              similarity=VALUES(similarity)
+            """,
+            dups,
+        )
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def forget_posts(ids: List[int]):
+    # drop the MinHash state of posts whose clean_text changed, plus the duplicates that were
+    # matched against them, so the next run signs and compares them again
+    if not ids:
+        return
+    ids = [int(i) for i in ids]
+    resign = set(ids)
+    resign.update(pid for pid, _ in load_duplicate_pairs(ids))
+    resign = sorted(resign)
+
+    # lsh_buckets is keyed by bucket first, so delete by the exact (bucket, post) pairs
+    sigs = load_signatures(resign)
+    buckets = [(key, pid) for pid, sig in sigs.items() for key in band_keys(sig)]
+
+    conn = get_conn()
+    cur = conn.cursor()
+    if buckets:
+        cur.executemany("DELETE FROM lsh_buckets WHERE bucket=%s AND post_row_id=%s", buckets)
+    for i in range(0, len(resign), 1000):
+        chunk = resign[i:i + 1000]
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(f"DELETE FROM post_duplicates WHERE post_row_id IN ({marks})", chunk)
+        cur.execute(f"DELETE FROM post_minhash WHERE post_row_id IN ({marks})", chunk)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def dedup_batch(rows, threshold: float):
+    sigs = [(int(r["id"]), minhash(r["clean_text"])) for r in rows]
+    keys = [band_keys(sig) for _, sig in sigs]
+
+    known = lookup_candidates(sorted({k for ks in keys for k in ks}))
+    cand_ids = sorted({pid for ids in known.values() for pid in ids})
+    sig_cache = load_signatures(cand_ids)
+
+    # only canonical posts are indexed, so every bucket hit is already a canonical id
+    batch_index: Dict[str, List[int]] = {}
+    new_buckets, dups = [], []
+
+    for (pid, sig), ks in zip(sigs, keys):
+        cands = set()
+        for key in ks:
+            cands.update(known.get(key, []))
+            cands.update(batch_index.get(key, []))
+
+        best, best_sim = None, 0.0
+        for c in sorted(cands):
+            if c == pid:
+                continue
+            other = sig_cache.get(c)
+            if other is None:
+                continue
+            sim = jaccard(sig, other)
+            if sim > best_sim:
+                best, best_sim = c, sim
+
+        if best is not None and best_sim >= threshold:
+            dups.append((pid, best, best_sim))
+            continue
+
+        sig_cache[pid] = sig
+        for key in ks:
+            batch_index.setdefault(key, []).append(pid)
+            new_buckets.append((key, pid))
+
+    save_batch(sigs, new_buckets, dups)
+    return dups
+
+
+def load_duplicate_pairs(canonical_ids: List[int]):
+    out = []
+    if not canonical_ids:
+        return out
+    conn = get_conn()
+    cur = conn.cursor()
+    for i in range(0, len(canonical_ids), 1000):
+        chunk = canonical_ids[i:i + 1000]
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(DUPLICATE_PAIRS_SQL.format(marks=marks), chunk)
+        out.extend((int(d), int(c)) for d, c in cur.fetchall())
+    cur.close()
+    conn.close()
+    return out
+
+
+def propagate_cluster_ids():
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE posts p
+        JOIN post_duplicates d ON d.post_row_id = p.id
+        JOIN posts c ON c.id = d.canonical_row_id
+        SET p.cluster_id = c.cluster_id
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit", type=int, default=5000, help="max new posts to sign per run")
+    ap.add_argument("--batch", type=int, default=500, help="posts per LSH lookup batch")
+    ap.add_argument("--threshold", type=float, default=0.8, help="min estimated Jaccard to mark a duplicate")
+    args = ap.parse_args()
+
+    migrate()
+
+    rows = load_new_posts(args.limit)
+    total_dups = 0
+    for i in range(0, len(rows), args.batch):
+        total_dups += len(dedup_batch(rows[i:i + args.batch], args.threshold))
+
+    print(f"Signed {len(rows)} new posts. Marked {total_dups} near-duplicates.")
+
+
+if __name__ == "__main__":
+    main()
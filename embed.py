@@ -5,36 +5,164 @@ from pathlib import Path
 
 import numpy as np
 from joblib import dump
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.decomposition import TruncatedSVD
+from sklearn.pipeline import make_pipeline
 
 from db import get_conn
+from parallel_transform import effective_n_jobs, parallel_transform
 
 
 MODEL_DIR = Path("models")
 MODEL_DIR.mkdir(exist_ok=True)
 
 
+LOAD_POSTS_SQL = """
+    SELECT p.id, p.clean_text
+    FROM posts p
+    LEFT JOIN post_duplicates d ON d.post_row_id = p.id
+    WHERE p.clean_text IS NOT NULL AND p.clean_text != ''
+      AND (p.is_ad IS NULL OR p.is_ad = 0)
+      AND d.post_row_id IS NULL
+    ORDER BY p.id DESC
+    LIMIT %s
+"""
+
+POST_CHUNK_SQL = """
+    SELECT p.id, p.clean_text
+    FROM posts p
+    LEFT JOIN post_duplicates d ON d.post_row_id = p.id
+    WHERE p.clean_text IS NOT NULL AND p.clean_text != ''
+      AND (p.is_ad IS NULL OR p.is_ad = 0)
+      AND d.post_row_id IS NULL
+      AND p.id <= %s
+      AND (%s IS NULL OR p.id < %s)
+    ORDER BY p.id DESC
+    LIMIT %s
+"""
+
+
 def load_posts(limit: int):
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
-    cur.execute(
-        """
-        SELECT id, clean_text
-        FROM posts
-        WHERE clean_text IS NOT NULL AND clean_text != ''
-          AND (is_ad IS NULL OR is_ad = 0)
-        ORDER BY id DESC
-        LIMIT %s
-        """,
-        (limit,),
-    )
+    cur.execute(LOAD_POSTS_SQL, (limit,))
     rows = cur.fetchall()
     cur.close()
     conn.close()
     return rows
 
 
+def max_post_id() -> int:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT MAX(id) FROM posts")
+    (max_id,) = cur.fetchone()
+    cur.close()
+    conn.close()
+    return int(max_id or 0)
+
+
+def iter_post_chunks(limit: int, chunk_size: int, max_id: int):
+    # keyset pagination so each chunk is an index range scan, not an OFFSET;
+    # max_id pins the document set so every pass sees the same posts
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    last_id = None
+    remaining = limit
+    try:
+        while remaining > 0:
+            cur.execute(POST_CHUNK_SQL, (max_id, last_id, last_id, min(chunk_size, remaining)))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            yield rows
+            remaining -= len(rows)
+            last_id = rows[-1]["id"]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def fit_out_of_core(args, max_id: int):
+    hasher = HashingVectorizer(stop_words="english", n_features=args.n_features,
+                               alternate_sign=False, norm=None)
+
+    # pass 1: document frequencies -> idf, with the same min_df/max_df cut as the in-memory path
+    df = np.zeros(args.n_features, dtype=np.int64)
+    n_docs = 0
+    for rows in iter_post_chunks(args.limit, args.chunk_size, max_id):
+        Xc = hasher.transform([r["clean_text"] for r in rows])
+        Xc.sum_duplicates()
+        df += np.bincount(Xc.indices, minlength=args.n_features)
+        n_docs += Xc.shape[0]
+
+    if n_docs < 2:
+        print(f"Not enough documents to embed: {n_docs}")
+        return None
+    print(f"Streamed {n_docs} documents for embedding.")
+
+    idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+    idf[(df < 5) | (df > 0.7 * n_docs)] = 0.0
+    tfidf = TfidfTransformer()
+    tfidf.idf_ = idf
+    vectorizer = make_pipeline(hasher, tfidf)
+
+    dim = min(args.dim, n_docs - 1, int(np.count_nonzero(idf)) - 1)
+    if dim < 2:
+        print(f"Cannot compute SVD with dim={args.dim} for {n_docs} docs. Try more data.")
+        return None
+
+    # passes 2..: streaming randomized range finder on X^T X, one chunk at a time
+    l = dim + 10
+    rng = np.random.RandomState(42)
+    Q = rng.standard_normal((args.n_features, l)).astype(np.float32)
+    for _ in range(1 + args.power_iters):
+        Y = np.zeros_like(Q)
+        for rows in iter_post_chunks(args.limit, args.chunk_size, max_id):
+            Xc = vectorizer.transform([r["clean_text"] for r in rows]).astype(np.float32)
+            Y += Xc.T @ (Xc @ Q)
+        Q, _ = np.linalg.qr(Y)
+
+    G = np.zeros((l, l), dtype=np.float64)
+    for rows in iter_post_chunks(args.limit, args.chunk_size, max_id):
+        Xc = vectorizer.transform([r["clean_text"] for r in rows]).astype(np.float32)
+        B = Xc @ Q
+        G += B.T @ B
+    w, V = np.linalg.eigh(G)
+    order = np.argsort(w)[::-1][:dim]
+
+    svd = TruncatedSVD(n_components=dim)
+    svd.components_ = (Q @ V[:, order].astype(np.float32)).T.astype(np.float64)
+    svd.singular_values_ = np.sqrt(np.maximum(w[order], 0.0))
+    svd.n_features_in_ = args.n_features
+    return vectorizer, svd, dim
+
+
+def main_out_of_core(args):
+    # posts scraped while the passes run would make idf, the range finder and the projection
+    # disagree about the corpus, so every pass stops at the newest id seen up front
+    max_id = max_post_id()
+    fitted = fit_out_of_core(args, max_id)
+    if fitted is None:
+        return
+    vectorizer, svd, dim = fitted
+
+    dump(vectorizer, MODEL_DIR / f"{args.model_version}_vectorizer.joblib")
+    dump(svd, MODEL_DIR / f"{args.model_version}_svd.joblib")
+
+    # final pass: project and write each chunk, so only one chunk is ever in memory
+    n = 0
+    for rows in iter_post_chunks(args.limit, args.chunk_size, max_id):
+        Z = svd.transform(vectorizer.transform([r["clean_text"] for r in rows]))
+        Z = Z / (np.linalg.norm(Z, axis=1, keepdims=True) + 1e-12)
+        upsert_embedding(rows, Z, method="hash_tfidf+stream_svd", model_version=args.model_version)
+        n += len(rows)
+        print(f"Wrote {n} embeddings...")
+
+    print(f"Saved embeddings to DB. dim={dim}, model_version={args.model_version}")
+    print(f"Model files saved under: {MODEL_DIR.resolve()}")
+
+
 def upsert_embedding(rows, vectors, method: str, model_version: str):
     conn = get_conn()
     cur = conn.cursor()
@@ -66,8 +194,19 @@ def main():
     ap.add_argument("--dim", type=int, default=128, help="embedding dimension after SVD")
     ap.add_argument("--max_features", type=int, default=5000, help="TF-IDF max vocab size")
     ap.add_argument("--model_version", type=str, default="tfidf_svd_v1", help="tag for DB/model files")
+    ap.add_argument("--n_jobs", type=int, default=1, help="processes for the transform step (-1 = all cores)")
+    ap.add_argument("--fit_sample", type=int, default=0, help="fit TF-IDF/SVD on at most this many docs (0 = all)")
+    ap.add_argument("--out_of_core", action="store_true",
+                    help="stream posts in chunks through a hashing vectorizer and streaming SVD")
+    ap.add_argument("--chunk_size", type=int, default=5000, help="docs per chunk in --out_of_core mode")
+    ap.add_argument("--n_features", type=int, default=2 ** 17, help="hashing space size in --out_of_core mode")
+    ap.add_argument("--power_iters", type=int, default=1, help="extra range-finder passes in --out_of_core mode")
     args = ap.parse_args()
 
+    if args.out_of_core:
+        main_out_of_core(args)
+        return
+
     rows = load_posts(args.limit)
     if len(rows) < 2:
         print(f"Not enough documents to embed: {len(rows)}")
@@ -77,8 +216,14 @@ def main():
     print(f"Loaded {len(texts)} documents for embedding.")
 
 
+    fit_texts = texts
+    if args.fit_sample and len(texts) > args.fit_sample:
+        rng = np.random.RandomState(42)
+        fit_texts = [texts[i] for i in rng.choice(len(texts), args.fit_sample, replace=False)]
+        print(f"Fitting on a sample of {len(fit_texts)} documents.")
+
     vectorizer = TfidfVectorizer(stop_words="english", max_features=args.max_features, min_df=5, max_df=0.7)
-    X = vectorizer.fit_transform(texts)
+    X = vectorizer.fit_transform(fit_texts)
 
     max_possible = min(X.shape[0] - 1, X.shape[1] - 1)
     dim = min(args.dim, max_possible)
@@ -86,14 +231,21 @@ def main():
         print(f"Cannot compute SVD with dim={args.dim} for X shape {X.shape}. Try more data.")
         return
 
+    n_jobs = effective_n_jobs(args.n_jobs)
     svd = TruncatedSVD(n_components=dim, random_state=42)
-    Z = svd.fit_transform(X)  # (n_docs, dim)
-
-    Z = Z / (np.linalg.norm(Z, axis=1, keepdims=True) + 1e-12)
+    if fit_texts is texts and n_jobs <= 1:
+        Z = svd.fit_transform(X)  # (n_docs, dim)
+    else:
+        svd.fit(X)
 
     dump(vectorizer, MODEL_DIR / f"{args.model_version}_vectorizer.joblib")
     dump(svd, MODEL_DIR / f"{args.model_version}_svd.joblib")
 
+    if not (fit_texts is texts and n_jobs <= 1):
+        # re-embed every document from the saved artifacts, sharded across processes
+        Z = parallel_transform(texts, args.model_version, n_jobs=n_jobs)
+
+    Z = Z / (np.linalg.norm(Z, axis=1, keepdims=True) + 1e-12)
 
     upsert_embedding(rows, Z, method="tfidf+svd", model_version=args.model_version)
 
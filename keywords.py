@@ -2,33 +2,41 @@ import argparse
 import numpy as np
 from joblib import load
 from db import get_conn
+from parallel_transform import parallel_transform
+
+CLUSTER_TEXTS_SQL = """
+    SELECT p.id, p.clean_text, p.cluster_id
+    FROM posts p
+    JOIN embeddings e ON e.post_row_id = p.id
+    WHERE e.model_version = %s AND p.cluster_id IS NOT NULL
+"""
+
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--model_version", type=str, default="tfidf_svd_v2")
     ap.add_argument("--k", type=int, default=8)
     ap.add_argument("--topn", type=int, default=10)
+    ap.add_argument("--n_jobs", type=int, default=1, help="processes for the TF-IDF transform (-1 = all cores)")
     args = ap.parse_args()
 
     vec_path = f"models/{args.model_version}_vectorizer.joblib"
     vectorizer = load(vec_path)
+    if not hasattr(vectorizer, "vocabulary_"):
+        print(f"{vec_path} uses hashed features (out-of-core model); no vocabulary to extract keywords from.")
+        return
     terms = np.array(vectorizer.get_feature_names_out())
 
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT p.id, p.clean_text, p.cluster_id
-        FROM posts p
-        JOIN embeddings e ON e.post_row_id = p.id
-        WHERE e.model_version = %s AND p.cluster_id IS NOT NULL
-    """, (args.model_version,))
+    cur.execute(CLUSTER_TEXTS_SQL, (args.model_version,))
     rows = cur.fetchall()
     cur.close()
 
     texts = [r["clean_text"] for r in rows]
     labels = np.array([int(r["cluster_id"]) for r in rows], dtype=int)
 
-    X = vectorizer.transform(texts)  # sparse TF-IDF
+    X = parallel_transform(texts, args.model_version, n_jobs=args.n_jobs, project=False)  # sparse TF-IDF
 
 
     out = []
@@ -26,14 +26,20 @@ def updater_loop(
 ):
     interval_sec = interval_minutes * 60
 
+    run("python migrations.py")
+
     while True:
         start = time.time()
         try:
     
             run(f"python scraper.py {scrape_n} --subs {subs} --sleep {sleep_sec}")
 
+            run("python bodies.py")
+
             run("python preprocess.py")
 
+            run("python dedup.py")
+
             run(
                 f"python embed.py --limit {embed_limit} --dim 128 "
                 f"--model_version {model_version}"
@@ -112,7 +118,8 @@ def main():
     print("Commands:")
     print("  :exit        quit")
     print("  :help        show help")
-    print("  :pca         print PCA image path\n")
+    print("  :pca         print PCA image path")
+    print("  :trends      show fastest-growing clusters this week\n")
 
     while True:
         q = input("> ").strip()
@@ -124,13 +131,20 @@ def main():
 
         if q.lower() == ":help":
             print("Type any text to query the closest cluster.")
-            print("Use :pca to see visualization path, :exit to quit.")
+            print("Use :pca to see visualization path, :trends for cluster growth, :exit to quit.")
             continue
 
         if q.lower() == ":pca":
             print(f"PCA image: {args.pca_out}")
             continue
 
+        if q.lower() == ":trends":
+            subprocess.run(
+                f"python trends.py --model_version {args.model_version} --k {args.k}",
+                shell=True,
+            )
+            continue
+
         safe_q = q.replace('"', '\\"')
         cmd = (
             f'python query.py "{safe_q}" '
@@ -0,0 +1,502 @@
+import re
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from db import get_conn
+
+
+def add_index(cur, table: str, name: str, columns: str, unique: bool = False):
+    # MySQL has no ADD INDEX IF NOT EXISTS
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    if cur.fetchone():
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cur.execute(f"ALTER TABLE {table} ADD {kind} {name} ({columns})")
+
+
+def drop_index(cur, table: str, name: str):
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    if cur.fetchone():
+        cur.execute(f"ALTER TABLE {table} DROP INDEX {name}")
+
+
+def add_column(cur, table: str, name: str, definition: str):
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+    """, (table, name))
+    if cur.fetchone():
+        return
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def m001_base_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+          id BIGINT AUTO_INCREMENT PRIMARY KEY,
+          post_id VARCHAR(16) NOT NULL,
+          subreddit VARCHAR(64) NOT NULL,
+          title TEXT,
+          body MEDIUMTEXT,
+          clean_text MEDIUMTEXT,
+          author_masked VARCHAR(32),
+          created_at DATETIME,
+          post_url VARCHAR(1024),
+          image_url VARCHAR(1024),
+          is_ad TINYINT(1) DEFAULT 0,
+          cluster_id INT NULL,
+          UNIQUE KEY uq_posts_post_id (post_id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+          id BIGINT AUTO_INCREMENT PRIMARY KEY,
+          post_row_id BIGINT NOT NULL,
+          method VARCHAR(32) NOT NULL,
+          dim INT NOT NULL,
+          vector_json LONGTEXT NOT NULL,
+          model_version VARCHAR(64) NOT NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          UNIQUE KEY uq_emb_post (post_row_id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cluster_topics (
+          id BIGINT AUTO_INCREMENT PRIMARY KEY,
+          model_version VARCHAR(64) NOT NULL,
+          k INT NOT NULL,
+          cluster_id INT NOT NULL,
+          top_terms TEXT,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          UNIQUE KEY uq_topics (model_version, k, cluster_id)
+        )
+    """)
+
+
+def m002_hot_path_indexes(cur):
+    # preprocess.py / embed.load_posts / cluster.load_posts: is_ad filter + clean_text check, newest first
+    add_index(cur, "posts", "idx_posts_ad_clean", "is_ad, clean_text(16), id")
+    # query.load_latest_posts: cluster_id = ? ORDER BY created_at DESC
+    add_index(cur, "posts", "idx_posts_cluster_created", "cluster_id, created_at")
+    # every model_version-scoped join (visualize, keywords, query, cluster_from_embeddings);
+    # covering for the join and for ORDER BY post_row_id DESC
+    add_index(cur, "embeddings", "idx_emb_version_post", "model_version, post_row_id")
+    add_index(cur, "cluster_topics", "uq_topics", "model_version, k, cluster_id", unique=True)
+
+
+def m003_dedup_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS post_minhash (
+          post_row_id BIGINT PRIMARY KEY,
+          signature BLOB NOT NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+          bucket CHAR(16) NOT NULL,
+          post_row_id BIGINT NOT NULL,
+          PRIMARY KEY (bucket, post_row_id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS post_duplicates (
+          post_row_id BIGINT PRIMARY KEY,
+          canonical_row_id BIGINT NOT NULL,
+          similarity FLOAT NOT NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          KEY idx_dup_canonical (canonical_row_id)
+        )
+    """)
+
+
+def m004_cluster_representatives(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cluster_representatives (
+          model_version VARCHAR(64) NOT NULL,
+          k INT NOT NULL,
+          cluster_id INT NOT NULL,
+          rank_no INT NOT NULL,
+          post_row_id BIGINT NOT NULL,
+          distance FLOAT NOT NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (model_version, k, cluster_id, rank_no)
+        )
+    """)
+
+
+def m005_scrape_state(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_state (
+          subreddit VARCHAR(64) PRIMARY KEY,
+          newest_post_id VARCHAR(16),
+          newest_created_at DATETIME,
+          backfill_after VARCHAR(32),
+          backfill_done TINYINT NOT NULL DEFAULT 0,
+          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def m006_cluster_trends(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cluster_labels (
+          model_version VARCHAR(64) NOT NULL,
+          k INT NOT NULL,
+          post_row_id BIGINT NOT NULL,
+          cluster_id INT NOT NULL,
+          PRIMARY KEY (model_version, k, post_row_id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cluster_trends (
+          model_version VARCHAR(64) NOT NULL,
+          k INT NOT NULL,
+          granularity ENUM('hour', 'day') NOT NULL,
+          subreddit VARCHAR(64) NOT NULL,
+          bucket_start DATETIME NOT NULL,
+          cluster_id INT NOT NULL,
+          n INT NOT NULL DEFAULT 0,
+          PRIMARY KEY (model_version, k, granularity, subreddit, bucket_start, cluster_id),
+          KEY idx_trends_bucket (model_version, k, granularity, bucket_start, cluster_id, n)
+        )
+    """)
+
+
+def m007_scrape_pending_cursor(cur):
+    # resume point of a head pass that ran out of budget before reaching the mark
+    add_column(cur, "scrape_state", "pending_after", "VARCHAR(32) NULL AFTER newest_created_at")
+    add_column(cur, "scrape_state", "pending_newest_id", "VARCHAR(16) NULL AFTER pending_after")
+    add_column(cur, "scrape_state", "pending_newest_created_at", "DATETIME NULL AFTER pending_newest_id")
+
+
+def m008_body_fetch_marker(cur):
+    # set once bodies.py has fetched a post, even when the body turned out empty
+    add_column(cur, "posts", "body_fetched_at", "DATETIME NULL AFTER body")
+    add_index(cur, "posts", "idx_posts_body_pending", "body_fetched_at, id")
+    # posts that already carry a body were fetched by an earlier run
+    cur.execute("UPDATE posts SET body_fetched_at = NOW() WHERE body_fetched_at IS NULL AND body != ''")
+
+
+def m009_cluster_centroids(cur):
+    # last fitted centers per cluster, so stream.py can start without re-reading every embedding
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cluster_centroids (
+          model_version VARCHAR(64) NOT NULL,
+          k INT NOT NULL,
+          cluster_id INT NOT NULL,
+          centroid MEDIUMBLOB NOT NULL,
+          n INT NOT NULL DEFAULT 0,
+          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+          PRIMARY KEY (model_version, k, cluster_id)
+        )
+    """)
+
+
+def m010_posts_created_index(cur):
+    # bodies.py --revalidate_hours: posts from the last day
+    add_index(cur, "posts", "idx_posts_created", "created_at")
+
+
+def m011_drop_unused_sub_created(cur):
+    # posts(subreddit, created_at) served no hot query; migration 2 no longer creates it
+    drop_index(cur, "posts", "idx_posts_sub_created")
+
+
+MIGRATIONS = [
+    (1, "base tables", m001_base_tables),
+    (2, "hot path indexes", m002_hot_path_indexes),
+    (3, "near-duplicate tables", m003_dedup_tables),
+    (4, "cluster representatives", m004_cluster_representatives),
+    (5, "scrape state", m005_scrape_state),
+    (6, "cluster trends", m006_cluster_trends),
+    (7, "scrape pending cursor", m007_scrape_pending_cursor),
+    (8, "body fetch marker", m008_body_fetch_marker),
+    (9, "cluster centroids", m009_cluster_centroids),
+    (10, "posts created_at index", m010_posts_created_index),
+    (11, "drop unused posts(subreddit, created_at) index", m011_drop_unused_sub_created),
+]
+
+
+# the queries each stage runs on every cycle, imported from the modules that run them.
+# Each entry is (sql, params, {table alias: index keys the plan may use}); a plan that
+# scans a table (type=ALL), reads it through any other key, or walks a whole index
+# (type=index) further than its LIMIT can justify fails the check.
+def hot_queries():
+    # imported here: several of these modules import migrate() from this one
+    import bodies
+    import cluster_from_embeddings
+    import dedup
+    import embed
+    import keywords
+    import preprocess
+    import query
+    import scraper
+    import snapshot
+    import stream
+    import trends
+
+    mv, k = SEED_MODEL_VERSION, 8
+    two = ",".join(["%s"] * 2)
+    until = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    # the backward PRIMARY walk is only fine where most rows match, so the LIMIT bounds it
+    newest_first = {"idx_posts_ad_clean", "PRIMARY"}
+    return {
+        "preprocess.pending": (preprocess.PENDING_SQL, (2000,), {"posts": {"idx_posts_ad_clean"}}),
+        "bodies.load_pending": (bodies.LOAD_PENDING_SQL, ("%/comments/%", 500),
+                                {"posts": {"idx_posts_body_pending"}}),
+        "bodies.revalidate": (bodies.REVALIDATE_SQL, (6, "%/comments/%", 500),
+                              {"posts": {"idx_posts_created", "idx_posts_body_pending"}}),
+        "dedup.load_new_posts": (dedup.NEW_POSTS_SQL, (5000,), {"p": newest_first, "m": {"PRIMARY"}}),
+        "dedup.lookup_candidates": (dedup.CANDIDATES_SQL.format(marks=two),
+                                    ("0123456789abcdef", "fedcba9876543210"), {"lsh_buckets": {"PRIMARY"}}),
+        "dedup.load_signatures": (dedup.SIGNATURES_SQL.format(marks=two), (1, 2), {"post_minhash": {"PRIMARY"}}),
+        "dedup.duplicate_pairs": (dedup.DUPLICATE_PAIRS_SQL.format(marks=two), (1, 2),
+                                  {"post_duplicates": {"idx_dup_canonical"}}),
+        "embed.load_posts": (embed.LOAD_POSTS_SQL, (5000,), {"p": newest_first, "d": {"PRIMARY"}}),
+        "embed.iter_post_chunks": (embed.POST_CHUNK_SQL, (10 ** 9, 1000, 1000, 5000),
+                                   {"p": newest_first, "d": {"PRIMARY"}}),
+        "cluster_from_embeddings.load_embeddings": (
+            cluster_from_embeddings.LOAD_EMBEDDINGS_SQL, (mv, 5000),
+            {"e": {"idx_emb_version_post"}, "p": {"PRIMARY"}, "d": {"PRIMARY"}}),
+        "query/visualize.centroids": (query.CENTROIDS_SQL, (mv,),
+                                      {"e": {"idx_emb_version_post", "uq_emb_post"},
+                                       "p": {"PRIMARY", "idx_posts_cluster_created"}}),
+        "keywords.cluster_texts": (keywords.CLUSTER_TEXTS_SQL, (mv,),
+                                   {"e": {"idx_emb_version_post", "uq_emb_post"},
+                                    "p": {"PRIMARY", "idx_posts_cluster_created"}}),
+        "stream.stored_centroids": (query.STORED_CENTROIDS_SQL, (mv, k), {"cluster_centroids": {"PRIMARY"}}),
+        "query.cluster_keywords": (query.CLUSTER_KEYWORDS_SQL, (mv, k, 0), {"cluster_topics": {"uq_topics"}}),
+        "query.representatives": (query.REPRESENTATIVES_SQL, (mv, k, 0, 5),
+                                  {"r": {"PRIMARY"}, "p": {"PRIMARY"}}),
+        "query.latest_posts": (query.LATEST_POSTS_SQL, (0, 3), {"posts": {"idx_posts_cluster_created"}}),
+        "scraper.known_post_ids": (scraper.KNOWN_IDS_SQL.format(marks=two), ("1", "2"),
+                                   {"posts": {"uq_posts_post_id"}}),
+        "stream.row_ids": (stream.ROW_IDS_SQL.format(marks=two), ("1", "2"), {"posts": {"uq_posts_post_id"}}),
+        "snapshot.iter_rows": (snapshot.ROWS_SQL, (k, mv, None, None, 5000),
+                               {"e": {"idx_emb_version_post"}, "p": {"PRIMARY"}, "l": {"PRIMARY"},
+                                "d": {"PRIMARY"}}),
+        "trends.load_previous": (trends.PREVIOUS_SQL.format(marks=two), (mv, k, 1, 2),
+                                 {"p": {"PRIMARY"}, "l": {"PRIMARY"}}),
+        "trends.growth_ranking": (trends.GROWTH_SQL + " GROUP BY cluster_id",
+                                  (until - timedelta(days=7), until - timedelta(days=7), mv, k, "day",
+                                   until - timedelta(days=14), until),
+                                  {"cluster_trends": {"idx_trends_bucket", "PRIMARY"}}),
+    }
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version INT PRIMARY KEY,
+          name VARCHAR(128) NOT NULL,
+          applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {int(r[0]) for r in cur.fetchall()}
+
+
+def migrate(verbose: bool = False) -> int:
+    conn = get_conn()
+    cur = conn.cursor(buffered=True)
+    done = applied_versions(cur)
+    n = 0
+    for version, name, fn in MIGRATIONS:
+        if version in done:
+            continue
+        fn(cur)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        conn.commit()
+        n += 1
+        if verbose:
+            print(f"Applied migration {version:03d}: {name}")
+    cur.close()
+    conn.close()
+    return n
+
+
+# a full index walk may examine at most this many times the query's LIMIT
+INDEX_SCAN_SLACK = 4
+
+
+def index_scan_bound(sql: str, params):
+    # every hot query with a LIMIT takes it as its last parameter
+    if re.search(r"\bLIMIT\s+%s\s*$", sql.strip()):
+        return int(params[-1])
+    return None
+
+
+def check_plans():
+    # EXPLAIN every hot query; each table must be read through one of its expected indexes
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    failures = []
+    for name, (sql, params, expected) in hot_queries().items():
+        limit = index_scan_bound(sql, params)
+        cur.execute("EXPLAIN " + sql, params)
+        for row in cur.fetchall():
+            table, access, key = row.get("table"), row.get("type"), row.get("key")
+            allowed = expected.get(table, set())
+            if table is None:
+                failures.append((name, table, f"no plan ({row.get('Extra')}); seed the database"))
+            elif access == "ALL":
+                failures.append((name, table, f"full table scan (~{row.get('rows')} rows)"))
+            elif key not in allowed:
+                failures.append((name, table, f"type={access} key={key}, expected one of {sorted(allowed)}"))
+            elif access == "index":
+                # rows / filtered = rows the optimizer expects to walk before the LIMIT is filled
+                examined = float(row.get("rows") or 0) * 100.0 / max(float(row.get("filtered") or 100.0), 0.01)
+                if limit is None or examined > INDEX_SCAN_SLACK * limit:
+                    bound = f"LIMIT {limit}" if limit is not None else "no LIMIT"
+                    failures.append((name, table, f"full index walk on {key} (~{examined:.0f} rows, {bound})"))
+            print(f"{name:<44} table={str(table):<18} type={str(access):<8} key={key}")
+    cur.close()
+    conn.close()
+    return failures
+
+
+SEED_MODEL_VERSION = "tfidf_svd_v2"
+SEED_SUBREDDITS = ("cybersecurity", "netsec", "sysadmin", "privacy")
+
+
+def seed_scratch(n: int):
+    # fill an EMPTY scratch database with n synthetic posts and their derived rows, so the
+    # optimizer sees realistic row counts; on near-empty tables any plan looks like a scan
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM posts")
+    if cur.fetchone()[0]:
+        cur.close()
+        conn.close()
+        raise RuntimeError("posts is not empty; --seed only runs against a scratch database")
+
+    rng = random.Random(0)
+    now = datetime.now()
+
+    def chunks(rows):
+        for i in range(0, len(rows), 5000):
+            yield rows[i:i + 5000]
+
+    posts = []
+    for i in range(n):
+        pid = f"s{i:06x}"
+        text = "" if rng.random() < 0.05 else f"synthetic post {i} about topic {i % 50}"
+        posts.append((
+            pid, SEED_SUBREDDITS[i % len(SEED_SUBREDDITS)], f"title {i}", text,
+            None if rng.random() < 0.05 else now, text,
+            now - timedelta(minutes=rng.randrange(60 * 24 * 60)),
+            f"https://old.reddit.com/r/x/comments/{pid}/", int(rng.random() < 0.02), i % 8,
+        ))
+    for part in chunks(posts):
+        cur.executemany("""
+            INSERT INTO posts (post_id, subreddit, title, body, body_fetched_at, clean_text,
+                               created_at, post_url, is_ad, cluster_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, part)
+    cur.execute("SELECT id, created_at, subreddit, cluster_id FROM posts ORDER BY id")
+    rows = cur.fetchall()
+    ids = [r[0] for r in rows]
+
+    # two model versions so the model_version filters are as selective as in production
+    versions = (SEED_MODEL_VERSION, SEED_MODEL_VERSION + "_old")
+    for part in chunks([(i, "tfidf+svd", 1, "[0.0]", versions[j % 2]) for j, i in enumerate(ids)]):
+        cur.executemany("""
+            INSERT INTO embeddings (post_row_id, method, dim, vector_json, model_version)
+            VALUES (%s, %s, %s, %s, %s)
+        """, part)
+    for part in chunks([(i, b"\0" * 512) for i in ids]):
+        cur.executemany("INSERT INTO post_minhash (post_row_id, signature) VALUES (%s, %s)", part)
+    buckets = [(f"{rng.getrandbits(64):016x}", i) for i in ids for _ in range(4)]
+    for part in chunks(buckets):
+        cur.executemany("INSERT IGNORE INTO lsh_buckets (bucket, post_row_id) VALUES (%s, %s)", part)
+    dups = [(ids[j], ids[j - 1], 0.9) for j in range(1, len(ids), 30)]
+    for part in chunks(dups):
+        cur.executemany(
+            "INSERT INTO post_duplicates (post_row_id, canonical_row_id, similarity) VALUES (%s, %s, %s)", part)
+    for part in chunks([(v, 8, i, c) for i, _, _, c in rows for v in versions]):
+        cur.executemany(
+            "INSERT INTO cluster_labels (model_version, k, post_row_id, cluster_id) VALUES (%s, %s, %s, %s)", part)
+
+    counts = {}
+    for _, created, sub, c in rows:
+        for g, b in (("hour", created.replace(minute=0, second=0, microsecond=0)),
+                     ("day", created.replace(hour=0, minute=0, second=0, microsecond=0))):
+            key = (g, sub, b, c)
+            counts[key] = counts.get(key, 0) + 1
+    for part in chunks([(v, 8, g, sub, b, c, m) for (g, sub, b, c), m in counts.items() for v in versions]):
+        cur.executemany("""
+            INSERT INTO cluster_trends (model_version, k, granularity, subreddit, bucket_start, cluster_id, n)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, part)
+    for v in versions:
+        for kk in (8, 12):
+            cur.executemany(
+                "INSERT INTO cluster_topics (model_version, k, cluster_id, top_terms) VALUES (%s, %s, %s, %s)",
+                [(v, kk, c, "a, b, c") for c in range(kk)])
+            cur.executemany(
+                "INSERT INTO cluster_centroids (model_version, k, cluster_id, centroid) VALUES (%s, %s, %s, %s)",
+                [(v, kk, c, b"\0" * 8) for c in range(kk)])
+            cur.executemany("""
+                INSERT INTO cluster_representatives (model_version, k, cluster_id, rank_no, post_row_id, distance)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [(v, kk, c, r, ids[(c * 10 + r) % len(ids)], 0.1 * r) for c in range(kk) for r in range(1, 11)])
+    conn.commit()
+
+    tables = ("posts", "embeddings", "post_minhash", "lsh_buckets", "post_duplicates", "cluster_labels",
+              "cluster_trends", "cluster_topics", "cluster_centroids", "cluster_representatives")
+    cur.execute("ANALYZE TABLE " + ", ".join(tables))
+    cur.fetchall()
+    cur.close()
+    conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    ap.add_argument("--check_plans", action="store_true",
+                    help="EXPLAIN the hot queries and exit non-zero unless each uses its expected index")
+    ap.add_argument("--seed", type=int, default=0,
+                    help="first fill an empty scratch database with this many synthetic posts")
+    args = ap.parse_args()
+
+    if args.status:
+        conn = get_conn()
+        cur = conn.cursor(buffered=True)
+        done = applied_versions(cur)
+        cur.close()
+        conn.close()
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:03d} {'applied' if version in done else 'pending':<8} {name}")
+        return
+
+    n = migrate(verbose=True)
+    print(f"Schema up to date ({n} migrations applied).")
+
+    if args.seed:
+        seed_scratch(args.seed)
+        print(f"Seeded {args.seed} synthetic posts.")
+
+    if args.check_plans:
+        failures = check_plans()
+        if failures:
+            print("\nUnexpected plans:")
+            for name, table, why in failures:
+                print(f"- {name}: {table}: {why}")
+            sys.exit(1)
+        print("\nAll hot queries use their expected indexes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from joblib import load
+
+
+# per-process model state, loaded once by the pool initializer
+_vectorizer = None
+_svd = None
+
+
+def _init_worker(model_version: str, project: bool):
+    global _vectorizer, _svd
+    _vectorizer = load(f"models/{model_version}_vectorizer.joblib")
+    _svd = load(f"models/{model_version}_svd.joblib") if project else None
+
+
+def _transform_shard(texts: List[str]):
+    X = _vectorizer.transform(texts)
+    if _svd is None:
+        return X.tocsr()
+    return _svd.transform(X)
+
+
+def stitch_csr(parts, n_cols: int) -> sp.csr_matrix:
+    # single preallocated copy of data/indices, shifting each shard's indptr into place
+    n_rows = sum(p.shape[0] for p in parts)
+    nnz = sum(p.nnz for p in parts)
+    data = np.empty(nnz, dtype=parts[0].dtype)
+    indices = np.empty(nnz, dtype=np.int64 if nnz > np.iinfo(np.int32).max else np.int32)
+    indptr = np.empty(n_rows + 1, dtype=indices.dtype)
+    indptr[0] = 0
+
+    r = 0
+    off = 0
+    for p in parts:
+        data[off:off + p.nnz] = p.data
+        indices[off:off + p.nnz] = p.indices
+        indptr[r + 1:r + 1 + p.shape[0]] = p.indptr[1:] + off
+        r += p.shape[0]
+        off += p.nnz
+    return sp.csr_matrix((data, indices, indptr), shape=(n_rows, n_cols), copy=False)
+
+
+def effective_n_jobs(n_jobs: Optional[int]) -> int:
+    # joblib convention: None -> 1, -1 -> all cores, -2 -> all but one, ...; 0 is invalid
+    if n_jobs is None:
+        return 1
+    if n_jobs == 0:
+        raise ValueError("n_jobs == 0 has no meaning; use 1 for a single process or -1 for all cores")
+    cpus = os.cpu_count() or 1
+    if n_jobs < 0:
+        return max(1, cpus + 1 + n_jobs)
+    return n_jobs
+
+
+def parallel_transform(texts: List[str], model_version: str, n_jobs: Optional[int] = 1,
+                       shard_size: int = 5000, project: bool = True):
+    # project=True -> dense SVD embeddings (n, dim); project=False -> CSR TF-IDF (n, vocab)
+    n_jobs = effective_n_jobs(n_jobs)
+    if n_jobs <= 1 or len(texts) <= shard_size:
+        _init_worker(model_version, project)
+        return _transform_shard(texts)
+
+    shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(model_version, project)) as ex:
+        results = ex.map(_transform_shard, shards)
+
+        if not project:
+            parts = list(results)
+            return stitch_csr(parts, parts[0].shape[1])
+
+        # map() yields in submission order, so each shard is written straight into its slot
+        out = None
+        r = 0
+        for part in results:
+            if out is None:
+                out = np.empty((len(texts), part.shape[1]), dtype=part.dtype)
+            out[r:r + part.shape[0]] = part
+            r += part.shape[0]
+        return out
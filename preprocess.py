@@ -10,18 +10,20 @@ def clean_text(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     return s
 
+PENDING_SQL = """
+    SELECT id, title, body
+    FROM posts
+    WHERE (clean_text IS NULL OR clean_text = '')
+      AND (is_ad IS NULL OR is_ad = 0)
+    ORDER BY id DESC
+    LIMIT %s
+"""
+
 def main(limit=2000):
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
 
-    cur.execute("""
-        SELECT id, title, body
-        FROM posts
-        WHERE (clean_text IS NULL OR clean_text = '')
-          AND (is_ad IS NULL OR is_ad = 0)
-        ORDER BY id DESC
-        LIMIT %s
-    """, (limit,))
+    cur.execute(PENDING_SQL, (limit,))
     rows = cur.fetchall()
 
     upd = conn.cursor()
@@ -4,6 +4,7 @@ import numpy as np
 from joblib import load
 from sklearn.metrics.pairwise import cosine_distances
 from db import get_conn
+from snapshot import load_snapshot
 
 def embed_query(text: str, model_version: str):
     vectorizer = load(f"models/{model_version}_vectorizer.joblib")
@@ -14,18 +15,52 @@ def embed_query(text: str, model_version: str):
     z = z / (np.linalg.norm(z, axis=1, keepdims=True) + 1e-12)
     return z[0]  # (dim,)
 
+CENTROIDS_SQL = """
+    SELECT e.vector_json, p.cluster_id
+    FROM embeddings e
+    JOIN posts p ON p.id = e.post_row_id
+    WHERE e.model_version=%s AND p.cluster_id IS NOT NULL
+"""
+
+STORED_CENTROIDS_SQL = """
+    SELECT cluster_id, centroid, n
+    FROM cluster_centroids
+    WHERE model_version=%s AND k=%s
+    ORDER BY cluster_id
+"""
+
+CLUSTER_KEYWORDS_SQL = """
+    SELECT top_terms
+    FROM cluster_topics
+    WHERE model_version=%s AND k=%s AND cluster_id=%s
+"""
+
+REPRESENTATIVES_SQL = """
+    SELECT p.title, p.post_url, r.distance
+    FROM cluster_representatives r
+    JOIN posts p ON p.id = r.post_row_id
+    WHERE r.model_version=%s AND r.k=%s AND r.cluster_id=%s
+    ORDER BY r.rank_no
+    LIMIT %s
+"""
+
+LATEST_POSTS_SQL = """
+    SELECT title, post_url
+    FROM posts
+    WHERE cluster_id=%s
+    ORDER BY created_at DESC
+    LIMIT %s
+"""
+
 def load_centroids(model_version: str, k: int):
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT e.vector_json, p.cluster_id
-        FROM embeddings e
-        JOIN posts p ON p.id = e.post_row_id
-        WHERE e.model_version=%s AND p.cluster_id IS NOT NULL
-    """, (model_version,))
+    cur.execute(CENTROIDS_SQL, (model_version,))
     rows = cur.fetchall()
     cur.close()
     conn.close()
+    if not rows:
+        return None
 
     dim = len(json.loads(rows[0]["vector_json"]))
     sums = np.zeros((k, dim), dtype=float)
@@ -45,29 +80,65 @@ def load_centroids(model_version: str, k: int):
             centroids[c] = centroids[c] / (np.linalg.norm(centroids[c]) + 1e-12)
     return centroids, cnt
 
+def centroids_from_snapshot(snap, k: int):
+    labels = np.asarray(snap["cluster_id"])
+    keep = np.where((labels >= 0) & (labels < k))[0]
+    X = np.asarray(snap["embedding"][keep], dtype=float)
+    sums = np.zeros((k, X.shape[1]), dtype=float)
+    np.add.at(sums, labels[keep], X)
+    cnt = np.bincount(labels[keep], minlength=k)
+    centroids = sums / np.maximum(cnt, 1)[:, None]
+    centroids = centroids / (np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12)
+    return centroids, cnt
+
+def snapshot_posts(snap, cluster_id: int, centroid, n: int = 5):
+    members = np.where(np.asarray(snap["cluster_id"]) == cluster_id)[0]
+    if len(members) == 0:
+        return [], []
+    d = 1.0 - np.asarray(snap["embedding"][members], dtype=float) @ centroid
+    m = min(n, len(members))
+    near = np.argpartition(d, m - 1)[:m]
+    near = members[near[np.argsort(d[near])]]
+    latest = members[np.argsort(np.asarray(snap["created_at"])[members])[::-1][:3]]
+    as_rows = lambda idx: [{"title": snap["title"][i], "post_url": snap["post_url"][i]} for i in idx]
+    return as_rows(near), as_rows(latest)
+
+def load_stored_centroids(model_version: str, k: int):
+    # centers saved by the last cluster_from_embeddings.py run; None if there are none for this k
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(STORED_CENTROIDS_SQL, (model_version, k))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    if len(rows) != k:
+        return None
+    centroids = np.stack([np.frombuffer(bytes(blob), dtype=np.float64) for _, blob, _ in rows])
+    centroids = centroids / (np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12)
+    return centroids, np.array([int(n) for _, _, n in rows], dtype=int)
+
 def load_cluster_keywords(model_version: str, k: int, cluster_id: int):
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT top_terms
-        FROM cluster_topics
-        WHERE model_version=%s AND k=%s AND cluster_id=%s
-    """, (model_version, k, cluster_id))
+    cur.execute(CLUSTER_KEYWORDS_SQL, (model_version, k, cluster_id))
     row = cur.fetchone()
     cur.close()
     conn.close()
     return row["top_terms"] if row else ""
 
-def load_representative_posts(cluster_id: int, n: int = 5):
+def load_representative_posts(model_version: str, k: int, cluster_id: int, n: int = 5):
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT title, post_url
-        FROM posts
-        WHERE cluster_id=%s
-        ORDER BY created_at DESC
-        LIMIT %s
-    """, (cluster_id, n))
+    cur.execute(REPRESENTATIVES_SQL, (model_version, k, cluster_id, n))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+def load_latest_posts(cluster_id: int, n: int = 3):
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(LATEST_POSTS_SQL, (cluster_id, n))
     rows = cur.fetchall()
     cur.close()
     conn.close()
@@ -78,22 +149,41 @@ def main():
     ap.add_argument("text", type=str, help="query text")
     ap.add_argument("--model_version", type=str, default="tfidf_svd_v2")
     ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--snapshot", type=str, default=None, help="answer from a snapshot instead of MySQL")
     args = ap.parse_args()
 
     q = embed_query(args.text, args.model_version)
-    centroids, cnt = load_centroids(args.model_version, args.k)
+    if args.snapshot:
+        snap = load_snapshot(args.snapshot, model_version=args.model_version, k=args.k)
+        centroids, cnt = centroids_from_snapshot(snap, args.k)
+    else:
+        loaded = load_centroids(args.model_version, args.k)
+        if loaded is None:
+            print(f"No clustered embeddings for model_version={args.model_version}. Run cluster_from_embeddings.py first.")
+            return
+        centroids, cnt = loaded
 
     d = cosine_distances([q], centroids)[0]
     best = int(np.argmin(d))
 
     print(f"\nBest cluster: {best}  (size={cnt[best]})")
-    print("Top terms:", load_cluster_keywords(args.model_version, args.k, best))
+    if args.snapshot:
+        print("Top terms:", snap["topics"].get(best, ""))
+        reps, latest = snapshot_posts(snap, best, centroids[best], n=5)
+    else:
+        print("Top terms:", load_cluster_keywords(args.model_version, args.k, best))
+        reps = load_representative_posts(args.model_version, args.k, best, n=5)
+        latest = load_latest_posts(best, n=3)
 
-    reps = load_representative_posts(best, n=5)
-    print("\nRecent posts in this cluster:")
+    print("\nRepresentative posts in this cluster:")
     for i, r in enumerate(reps, 1):
         print(f"{i}. {r['title']}")
         print(f"   {r['post_url']}")
 
+    print("\nLatest posts in this cluster:")
+    for i, r in enumerate(latest, 1):
+        print(f"{i}. {r['title']}")
+        print(f"   {r['post_url']}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
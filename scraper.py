@@ -9,6 +9,7 @@ from bs4 import BeautifulSoup
 from dateutil import parser as dtparser
 
 from db import get_conn
+from migrations import migrate
 
 UA = "DSCI560-Lab5-OldRedditScraper/1.0 (contact: your_email@usc.edu)"
 BASE = "https://old.reddit.com"
@@ -141,8 +142,8 @@ def upsert_posts(rows: List[Dict]) -> int:
     VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
     ON DUPLICATE KEY UPDATE
       title=VALUES(title),
-      body=VALUES(body),
-      clean_text=VALUES(clean_text),
+      clean_text=IF(VALUES(body)='', clean_text, VALUES(clean_text)),
+      body=IF(VALUES(body)='', body, VALUES(body)),
       author_masked=VALUES(author_masked),
       created_at=VALUES(created_at),
       post_url=VALUES(post_url),
@@ -162,6 +163,188 @@ def upsert_posts(rows: List[Dict]) -> int:
     conn.close()
     return n
 
+def load_state(subreddit: str) -> Dict:
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT newest_post_id, newest_created_at, pending_after, pending_newest_id,
+               pending_newest_created_at, backfill_after, backfill_done
+        FROM scrape_state
+        WHERE subreddit=%s
+    """, (subreddit,))
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return row or {}
+
+def save_state(subreddit: str, state: Dict):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO scrape_state (subreddit, newest_post_id, newest_created_at, pending_after,
+                                  pending_newest_id, pending_newest_created_at, backfill_after, backfill_done)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+        ON DUPLICATE KEY UPDATE
+          newest_post_id=VALUES(newest_post_id),
+          newest_created_at=VALUES(newest_created_at),
+          pending_after=VALUES(pending_after),
+          pending_newest_id=VALUES(pending_newest_id),
+          pending_newest_created_at=VALUES(pending_newest_created_at),
+          backfill_after=VALUES(backfill_after),
+          backfill_done=VALUES(backfill_done);
+    """, (
+        subreddit, state.get("newest_post_id"), state.get("newest_created_at"),
+        state.get("pending_after"), state.get("pending_newest_id"), state.get("pending_newest_created_at"),
+        state.get("backfill_after"), int(bool(state.get("backfill_done"))),
+    ))
+    cur.close()
+    conn.close()
+
+def post_id_num(post_id: Optional[str]) -> int:
+    try:
+        return int(post_id, 36)
+    except (TypeError, ValueError):
+        return -1
+
+KNOWN_IDS_SQL = "SELECT post_id FROM posts WHERE post_id IN ({marks})"
+
+def known_post_ids(post_ids: List[str]) -> set:
+    if not post_ids:
+        return set()
+    conn = get_conn()
+    cur = conn.cursor()
+    marks = ",".join(["%s"] * len(post_ids))
+    cur.execute(KNOWN_IDS_SQL.format(marks=marks), post_ids)
+    known = {r[0] for r in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return known
+
+def fetch_with_retry(sub: str, after: Optional[str]):
+    try:
+        return fetch_page(sub, after)
+    except requests.HTTPError as e:
+        print(f"[{sub}] HTTPError: {e} | after={after} -> sleeping 10s")
+    except Exception as e:
+        print(f"[{sub}] Error: {e} | after={after} -> sleeping 10s")
+    time.sleep(10)
+    return None
+
+def scrape_head(sub: str, state: Dict, budget: int, max_pages: int, sleep: float,
+                sink=None, on_state=None) -> int:
+    # page /new/ from the top down to the high-water mark. A pass cut short by the budget
+    # or max_pages keeps the old mark and stores a pending cursor; the next call finishes
+    # that gap first, so nothing between the cursor and the mark is ever skipped. Without a
+    # mark there is no gap to bound, so the rest of the listing goes to the backfill cursor.
+    # `sink` receives each page's new posts (defaults to writing them to the DB);
+    # `on_state` receives the updated state once the pass ends (defaults to save_state)
+    sink = sink or upsert_posts
+    on_state = on_state or save_state
+    hwm = post_id_num(state.get("newest_post_id"))
+    if hwm < 0 and state.get("pending_after"):
+        # a gap with no mark under it is unbounded: that deep crawl belongs to the backfill cursor
+        if not state.get("backfill_after"):
+            state["backfill_after"] = state["pending_after"]
+            state["backfill_done"] = 0
+        state["pending_after"] = None
+        state["pending_newest_id"] = None
+        state["pending_newest_created_at"] = None
+    resumed = bool(state.get("pending_after"))
+    after = state.get("pending_after")
+    newest = (state.get("pending_newest_id"), state.get("pending_newest_created_at")) if resumed else None
+    pages = 0
+    saved_total = 0
+    complete = False
+
+    while saved_total < budget and pages < max_pages:
+        pages += 1
+        res = fetch_with_retry(sub, after)
+        if res is None:
+            continue
+        html, next_after = res
+
+        posts = parse_posts(html, sub)
+        # promoted posts can sit anywhere in the listing, so they never decide where to stop
+        organic = [p for p in posts if not p["is_ad"]]
+        if newest is None and organic:
+            top = max(organic, key=lambda p: post_id_num(p["post_id"]))
+            newest = (top["post_id"], top["created_at"])
+
+        known = known_post_ids([p["post_id"] for p in posts])
+        fresh = [p for p in posts if p["post_id"] not in known and post_id_num(p["post_id"]) > hwm]
+        saved = sink(fresh)
+        saved_total += saved
+        print(f"[{sub}] head page={pages} new={saved} known={len(posts) - len(fresh)} next_after={next_after}")
+
+        if hwm >= 0:
+            reached = any(post_id_num(p["post_id"]) <= hwm for p in organic)
+        else:
+            # no mark yet (first run on an existing DB): stop on a page that is entirely known
+            reached = bool(organic) and all(p["post_id"] in known for p in organic)
+
+        if reached or not next_after or next_after == after:
+            complete = True
+            if hwm < 0 and reached and next_after and not state.get("backfill_after"):
+                state["backfill_after"] = next_after
+            break
+        after = next_after
+        time.sleep(sleep)
+
+    if complete:
+        if newest and post_id_num(newest[0]) > hwm:
+            state["newest_post_id"], state["newest_created_at"] = newest
+        state["pending_after"] = None
+        state["pending_newest_id"] = None
+        state["pending_newest_created_at"] = None
+    elif hwm < 0:
+        # first pass on a subreddit without a mark: the top page becomes the mark and the rest
+        # of the listing is left to scrape_backfill, so the next run reads the top again
+        if newest:
+            state["newest_post_id"], state["newest_created_at"] = newest
+        if after and not state.get("backfill_after"):
+            state["backfill_after"] = after
+            state["backfill_done"] = 0
+    elif after and newest:
+        state["pending_after"] = after
+        state["pending_newest_id"], state["pending_newest_created_at"] = newest
+    on_state(sub, state)
+
+    # a finished gap leaves the top of the listing unread; start a fresh pass with what is left
+    if resumed and complete and saved_total < budget and pages < max_pages:
+        saved_total += scrape_head(sub, state, budget - saved_total, max_pages - pages, sleep, sink, on_state)
+    return saved_total
+
+def scrape_backfill(sub: str, state: Dict, budget: int, max_pages: int, sleep: float) -> int:
+    # resume the historical crawl from the stored `after` cursor
+    after = state.get("backfill_after")
+    if state.get("backfill_done") or not after:
+        return 0
+    pages = 0
+    saved_total = 0
+
+    while saved_total < budget and pages < max_pages:
+        pages += 1
+        res = fetch_with_retry(sub, after)
+        if res is None:
+            continue
+        html, next_after = res
+
+        posts = parse_posts(html, sub)
+        saved = upsert_posts(posts)
+        saved_total += saved
+        print(f"[{sub}] backfill page={pages} saved={saved} next_after={next_after}")
+
+        if not next_after or next_after == after:
+            state["backfill_done"] = 1
+            save_state(sub, state)
+            break
+        after = next_after
+        state["backfill_after"] = after
+        save_state(sub, state)
+        time.sleep(sleep)
+
+    return saved_total
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("num_posts", type=int, help="total number of posts to fetch (across all subreddits)")
@@ -169,42 +352,23 @@ def main():
                     help="comma-separated subreddits, e.g. cybersecurity,netsec,hacking")
     ap.add_argument("--sleep", type=float, default=1.2, help="sleep seconds between page requests")
     ap.add_argument("--max_pages_per_sub", type=int, default=200, help="safety cap")
+    ap.add_argument("--backfill", action="store_true",
+                    help="after new posts, continue the historical crawl from the saved cursor")
     args = ap.parse_args()
 
     subs = [s.strip() for s in args.subs.split(",") if s.strip()]
     target = args.num_posts
 
+    migrate()
     total_saved = 0
 
     for sub in subs:
-        after = None
-        pages = 0
-
-        while total_saved < target and pages < args.max_pages_per_sub:
-            pages += 1
-
-            try:
-                html, next_after = fetch_page(sub, after)
-            except requests.HTTPError as e:
-                print(f"[{sub}] HTTPError: {e} | after={after} -> sleeping 10s")
-                time.sleep(10)
-                continue
-            except Exception as e:
-                print(f"[{sub}] Error: {e} | after={after} -> sleeping 10s")
-                time.sleep(10)
-                continue
-
-            posts = parse_posts(html, sub)
-            saved = upsert_posts(posts)
-
-            total_saved += saved
-            print(f"[{sub}] page={pages} saved={saved} total_saved={total_saved} next_after={next_after}")
-
-            if not next_after or next_after == after:
-                break
-            after = next_after
-
-            time.sleep(args.sleep)
+        state = load_state(sub)
+        total_saved += scrape_head(sub, state, target - total_saved, args.max_pages_per_sub, args.sleep)
+        if args.backfill and total_saved < target:
+            total_saved += scrape_backfill(sub, state, target - total_saved, args.max_pages_per_sub, args.sleep)
+        print(f"[{sub}] total_saved={total_saved} newest={state.get('newest_post_id')} "
+              f"backfill_after={state.get('backfill_after')}")
 
         if total_saved >= target:
             break
@@ -212,4 +376,4 @@ def main():
     print(f"Done. Total saved/updated rows: {total_saved}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,239 @@
+import os
+import json
+import shutil
+import argparse
+from pathlib import Path
+from typing import Optional
+from datetime import datetime, timezone
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from db import get_conn
+
+
+SNAPSHOT_DIR = Path("snapshots")
+FORMAT_VERSION = 1
+TEXT_COLUMNS = ("subreddit", "title", "clean_text", "post_url")
+
+
+class TextColumn:
+    # Arrow-style string column: one utf-8 blob plus int64 offsets, both memory-mapped
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def next_version_dir(model_version: str) -> Path:
+    base = SNAPSHOT_DIR / model_version
+    base.mkdir(parents=True, exist_ok=True)
+    versions = [int(p.name[1:]) for p in base.iterdir() if p.is_dir() and p.name[1:].isdigit()]
+    return base / f"v{max(versions, default=0) + 1}"
+
+
+ROWS_SQL = """
+    SELECT e.post_row_id, e.vector_json, p.subreddit, p.title, p.clean_text, p.post_url,
+           p.created_at, l.cluster_id, d.canonical_row_id
+    FROM embeddings e
+    JOIN posts p ON p.id = e.post_row_id
+    LEFT JOIN cluster_labels l
+      ON l.post_row_id = e.post_row_id AND l.model_version = e.model_version AND l.k = %s
+    LEFT JOIN post_duplicates d ON d.post_row_id = e.post_row_id
+    WHERE e.model_version = %s
+      AND (%s IS NULL OR e.post_row_id < %s)
+    ORDER BY e.post_row_id DESC
+    LIMIT %s
+"""
+
+
+def iter_rows(model_version: str, k: int, chunk_size: int):
+    # labels come from cluster_labels for this model_version/k, not from posts.cluster_id,
+    # which holds whatever clustering run (any model or k) wrote last
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    last_id = None
+    try:
+        while True:
+            cur.execute(ROWS_SQL, (k, model_version, last_id, last_id, chunk_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1]["post_row_id"]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def export_snapshot(model_version: str, k: int, chunk_size: int = 5000) -> Path:
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT COUNT(*) AS n, MAX(dim) AS dim
+        FROM embeddings
+        WHERE model_version=%s
+    """, (model_version,))
+    stats = cur.fetchone()
+    cur.execute("""
+        SELECT cluster_id, top_terms
+        FROM cluster_topics
+        WHERE model_version=%s AND k=%s
+    """, (model_version, k))
+    topics = {int(r["cluster_id"]): r["top_terms"] for r in cur.fetchall()}
+    cur.close()
+    conn.close()
+
+    n, dim = int(stats["n"] or 0), int(stats["dim"] or 0)
+    if n == 0:
+        raise RuntimeError(f"No embeddings for model_version={model_version}")
+
+    out = next_version_dir(model_version)
+    tmp = out.with_name(out.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    # fixed-width columns are preallocated on disk and filled chunk by chunk
+    emb = open_memmap(tmp / "embedding.npy", mode="w+", dtype=np.float32, shape=(n, dim))
+    ids = open_memmap(tmp / "post_row_id.npy", mode="w+", dtype=np.int64, shape=(n,))
+    labels = open_memmap(tmp / "cluster_id.npy", mode="w+", dtype=np.int32, shape=(n,))
+    created = open_memmap(tmp / "created_at.npy", mode="w+", dtype=np.int64, shape=(n,))
+    canonical = open_memmap(tmp / "canonical_row_id.npy", mode="w+", dtype=np.int64, shape=(n,))
+
+    blobs = {c: open(tmp / f"{c}.bin", "wb") for c in TEXT_COLUMNS}
+    offsets = {c: np.zeros(n + 1, dtype=np.int64) for c in TEXT_COLUMNS}
+
+    i = 0
+    try:
+        for rows in iter_rows(model_version, k, chunk_size):
+            for r in rows:
+                if i >= n:
+                    break
+                v = json.loads(r["vector_json"])
+                if len(v) != dim:
+                    continue
+                emb[i] = v
+                ids[i] = r["post_row_id"]
+                labels[i] = -1 if r["cluster_id"] is None else r["cluster_id"]
+                ts = r["created_at"]
+                created[i] = -1 if ts is None else int(ts.replace(tzinfo=timezone.utc).timestamp())
+                canonical[i] = -1 if r["canonical_row_id"] is None else r["canonical_row_id"]
+                for c in TEXT_COLUMNS:
+                    b = (r[c] or "").encode("utf-8")
+                    blobs[c].write(b)
+                    offsets[c][i + 1] = offsets[c][i] + len(b)
+                i += 1
+            if i >= n:
+                break
+    finally:
+        for f in blobs.values():
+            f.close()
+
+    for c in TEXT_COLUMNS:
+        np.save(tmp / f"{c}.offsets.npy", offsets[c][:i + 1])
+    for m in (emb, ids, labels, created, canonical):
+        m.flush()
+    del emb, ids, labels, created, canonical
+
+    meta = {
+        "format": "npy-bundle",
+        "format_version": FORMAT_VERSION,
+        "model_version": model_version,
+        "k": k,
+        "n": i,
+        "dim": dim,
+        "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "order": "post_row_id DESC",
+        "topics": {str(c): t for c, t in sorted(topics.items())},
+    }
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    os.replace(tmp, out)
+    return out
+
+
+def resolve_snapshot(path_or_version: str) -> Path:
+    # accepts a snapshot dir, a model_version dir, or a bare model_version (-> latest vN)
+    p = Path(path_or_version)
+    if (p / "meta.json").exists():
+        return p
+    base = p if p.is_dir() else SNAPSHOT_DIR / path_or_version
+    versions = sorted(
+        (int(d.name[1:]), d) for d in base.iterdir() if d.is_dir() and d.name[1:].isdigit()
+    ) if base.is_dir() else []
+    if not versions:
+        raise FileNotFoundError(f"No snapshot found for {path_or_version}")
+    return versions[-1][1]
+
+
+def load_snapshot(path_or_version: str, mmap: bool = True,
+                  model_version: Optional[str] = None, k: Optional[int] = None):
+    # model_version / k, when given, must match what the snapshot was exported with
+    p = resolve_snapshot(path_or_version)
+    with open(p / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format_version={meta.get('format_version')}")
+    if model_version is not None and meta.get("model_version") != model_version:
+        raise ValueError(f"Snapshot {p} is model_version={meta.get('model_version')}, not {model_version}")
+    if k is not None and meta.get("k") != k:
+        raise ValueError(f"Snapshot {p} was exported with k={meta.get('k')}, not {k}")
+
+    n = meta["n"]
+    mode = "r" if mmap else None
+    snap = {"meta": meta, "path": p}
+    for c in ("embedding", "post_row_id", "cluster_id", "created_at", "canonical_row_id"):
+        snap[c] = np.load(p / f"{c}.npy", mmap_mode=mode)[:n]
+    for c in TEXT_COLUMNS:
+        blob = np.memmap(p / f"{c}.bin", dtype=np.uint8, mode="r") if os.path.getsize(p / f"{c}.bin") else b""
+        snap[c] = TextColumn(blob, np.load(p / f"{c}.offsets.npy", mmap_mode=mode))
+    snap["topics"] = {int(c): t for c, t in meta.get("topics", {}).items()}
+    return snap
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ex = sub.add_parser("export", help="write a columnar snapshot for one model_version")
+    ex.add_argument("--model_version", type=str, default="tfidf_svd_v2")
+    ex.add_argument("--k", type=int, default=8, help="k whose cluster_topics are bundled")
+    ex.add_argument("--chunk_size", type=int, default=5000)
+
+    info = sub.add_parser("info", help="print a snapshot's metadata")
+    info.add_argument("snapshot", type=str, help="snapshot dir or model_version")
+
+    args = ap.parse_args()
+
+    if args.command == "export":
+        out = export_snapshot(args.model_version, args.k, args.chunk_size)
+        print(f"Snapshot written: {out}")
+    else:
+        snap = load_snapshot(args.snapshot)
+        meta = dict(snap["meta"])
+        meta.pop("topics", None)
+        print(f"{snap['path']}")
+        for key, val in meta.items():
+            print(f"  {key}: {val}")
+        labels = np.asarray(snap["cluster_id"])
+        print(f"  clustered: {int((labels >= 0).sum())}, duplicates: {int((snap['canonical_row_id'] >= 0).sum())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+
+def _normalize_rows(C):
+    return C / (np.linalg.norm(C, axis=1, keepdims=True) + 1e-12)
+
+
+def _assign(X, C, chunk: int = 50000):
+    # cosine similarity = sparse-dense matmul on unit rows; chunked so only chunk x k is dense
+    n = X.shape[0]
+    labels = np.empty(n, dtype=int)
+    best = np.empty(n, dtype=float)
+    for i in range(0, n, chunk):
+        S = np.asarray(X[i:i + chunk] @ C.T)
+        labels[i:i + chunk] = S.argmax(axis=1)
+        best[i:i + chunk] = S.max(axis=1)
+    return labels, best
+
+
+def kmeans_pp_init(X, k: int, rng: np.random.RandomState, sample_size: int = 20000):
+    # k-means++ seeding on a row sample, with cosine distance 1 - sim
+    n = X.shape[0]
+    idx = rng.choice(n, min(n, max(sample_size, k)), replace=False)
+    Xs = X[idx]
+    m = Xs.shape[0]
+
+    def row(i):
+        return Xs[i].toarray().ravel() if sp.issparse(Xs) else np.asarray(Xs[i]).ravel()
+
+    # greedy k-means++ as in sklearn: draw 2 + log(k) candidates per step and keep the one
+    # that lowers the potential most, so one unlucky draw cannot merge two clusters
+    trials = 2 + int(np.log(k))
+    C = np.zeros((k, X.shape[1]), dtype=float)
+    C[0] = row(rng.randint(m))
+    d = np.clip(1.0 - np.asarray(Xs @ C[0]).ravel(), 0, None)
+    for j in range(1, k):
+        w = d ** 2
+        total = w.sum()
+        if total > 0:
+            cands = np.searchsorted(np.cumsum(w), rng.random_sample(trials) * total)
+            cands = np.minimum(cands, m - 1)
+        else:
+            cands = rng.randint(m, size=trials)
+        S = Xs[cands] @ Xs.T
+        S = S.toarray() if sp.issparse(S) else np.asarray(S)
+        D = np.minimum(d, np.clip(1.0 - S, 0, None))
+        best = int(np.argmin((D ** 2).sum(axis=1)))
+        C[j] = row(cands[best])
+        d = D[best]
+    return _normalize_rows(C)
+
+
+def _centroids(X, labels, k: int):
+    # per-cluster sums as one sparse (k x n) @ (n x vocab) product
+    n = X.shape[0]
+    M = sp.csr_matrix((np.ones(n), (labels, np.arange(n))), shape=(k, n))
+    C = M @ X
+    return np.asarray(C.toarray() if sp.issparse(C) else C, dtype=float)
+
+
+def spherical_kmeans(X, k: int, max_iter: int = 100, tol: float = 1e-4,
+                     sample_size: int = 20000, random_state: int = 42):
+    # returns (labels, unit-norm centers, inertia = sum of 1 - cosine)
+    X = normalize(X)
+    rng = np.random.RandomState(random_state)
+    C = kmeans_pp_init(X, k, rng, sample_size)
+
+    prev_obj = None
+    labels = None
+    for _ in range(max_iter):
+        new_labels, best = _assign(X, C)
+        obj = best.sum()
+
+        C = _centroids(X, new_labels, k)
+        empty = np.where(~C.any(axis=1))[0]
+        if len(empty):
+            # reseed empty clusters with the worst-fitting points
+            worst = np.argsort(best)[:len(empty)]
+            for c, i in zip(empty, worst):
+                C[c] = X[i].toarray().ravel() if sp.issparse(X) else X[i]
+        C = _normalize_rows(C)
+
+        converged = labels is not None and (
+            np.array_equal(labels, new_labels)
+            or (prev_obj is not None and abs(obj - prev_obj) <= tol * abs(prev_obj))
+        )
+        labels, prev_obj = new_labels, obj
+        if converged:
+            break
+
+    labels, best = _assign(X, C)
+    return labels, C, float(X.shape[0] - best.sum())
+
+
+def minibatch_spherical_kmeans(X, k: int, batch_size: int = 1024, max_iter: int = 300,
+                               max_no_improvement: int = 10, tol: float = 1e-4,
+                               sample_size: int = 20000, random_state: int = 42):
+    X = normalize(X)
+    rng = np.random.RandomState(random_state)
+    C = kmeans_pp_init(X, k, rng, sample_size)
+    counts = np.zeros(k, dtype=float)
+    n = X.shape[0]
+
+    ewa = None
+    best_ewa = None
+    stale = 0
+    for _ in range(max_iter):
+        # sampling with replacement is O(batch_size); choice(replace=False) permutes all n rows
+        idx = rng.randint(0, n, batch_size)
+        Xb = X[idx]
+        lb, sb = _assign(Xb, C)
+
+        # running-mean update per touched center, then project back to the sphere
+        S = _centroids(Xb, lb, k)
+        nb = np.bincount(lb, minlength=k).astype(float)
+        touched = nb > 0
+        C[touched] = C[touched] * counts[touched, None] + S[touched]
+        counts += nb
+        C[touched] = _normalize_rows(C[touched])
+
+        # early stopping on a smoothed batch objective, as in sklearn's MiniBatchKMeans
+        batch_obj = 1.0 - sb.mean()
+        alpha = min(1.0, 2.0 * len(idx) / (n + 1))
+        ewa = batch_obj if ewa is None else ewa * (1 - alpha) + batch_obj * alpha
+        if best_ewa is None or ewa < best_ewa - tol * best_ewa:
+            best_ewa = ewa
+            stale = 0
+        else:
+            stale += 1
+            if stale >= max_no_improvement:
+                break
+
+    labels, best = _assign(X, C)
+    return labels, C, float(n - best.sum())
+
+
+def closest_to_centers(X, C, labels, topn: int):
+    # per cluster: member indices and cosine distances, closest first (partial sort)
+    X = normalize(X)
+    out = []
+    for c in range(C.shape[0]):
+        members = np.where(labels == c)[0]
+        if len(members) == 0:
+            out.append((c, members, np.array([])))
+            continue
+        d = 1.0 - np.asarray(X[members] @ C[c]).ravel()
+        m = min(topn, len(members))
+        part = np.argpartition(d, m - 1)[:m]
+        part = part[np.argsort(d[part])]
+        out.append((c, members[part], d[part]))
+    return out
@@ -0,0 +1,212 @@
+import time
+import queue
+import argparse
+import threading
+from typing import Dict, List
+
+import numpy as np
+from joblib import load
+
+from db import get_conn
+from migrations import migrate
+from preprocess import clean_text
+from scraper import load_state, save_state, scrape_head, upsert_posts
+from dedup import dedup_batch
+from embed import upsert_embedding
+from cluster_from_embeddings import update_cluster_ids
+from query import load_centroids, load_stored_centroids
+from trends import apply_label_deltas
+
+
+STOP = object()
+
+
+class MeteredQueue(queue.Queue):
+    # bounded queue that remembers its peak depth; put() blocks when full (backpressure)
+    def __init__(self, name: str, maxsize: int):
+        super().__init__(maxsize=maxsize)
+        self.name = name
+        self.peak = 0
+        self.items_in = 0
+        self.blocked_sec = 0.0
+
+    def put(self, item, block=True, timeout=None):
+        t0 = time.time()
+        super().put(item, block, timeout)
+        self.blocked_sec += time.time() - t0
+        if item is not STOP:
+            self.items_in += 1
+        self.peak = max(self.peak, self.qsize())
+
+    def stats(self) -> str:
+        return (f"{self.name}: depth={self.qsize()}/{self.maxsize} peak={self.peak} "
+                f"in={self.items_in} put_blocked={self.blocked_sec:.1f}s")
+
+
+ROW_IDS_SQL = "SELECT post_id, id FROM posts WHERE post_id IN ({marks})"
+
+
+def row_ids(post_ids: List[str]) -> Dict[str, int]:
+    if not post_ids:
+        return {}
+    conn = get_conn()
+    cur = conn.cursor()
+    marks = ",".join(["%s"] * len(post_ids))
+    cur.execute(ROW_IDS_SQL.format(marks=marks), post_ids)
+    out = {pid: int(i) for pid, i in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return out
+
+
+def scrape_stage(subs, per_sub: int, max_pages: int, sleep: float, out_q: MeteredQueue):
+    def sink(posts):
+        if posts:
+            out_q.put(("posts", time.time(), posts))
+        return len(posts)
+
+    def on_state(sub, state):
+        # the new mark travels behind the pass's batches; clean_stage saves it once they are stored
+        out_q.put(("state", sub, dict(state)))
+
+    for sub in subs:
+        state = load_state(sub)
+        scrape_head(sub, state, per_sub, max_pages, sleep, sink=sink, on_state=on_state)
+
+
+def clean_stage(in_q: MeteredQueue, out_q: MeteredQueue, threshold: float):
+    failed = set()
+    while True:
+        item = in_q.get()
+        if item is STOP:
+            out_q.put(STOP)
+            return
+        kind, a, b = item
+        if kind == "state":
+            # a lost batch keeps the old mark, so the next sweep pages over those posts again
+            if a in failed:
+                failed.discard(a)
+                print(f"[clean] r/{a}: batch failed, keeping the previous mark")
+            else:
+                save_state(a, b)
+            continue
+        t0, posts = a, b
+        try:
+            for p in posts:
+                p["clean_text"] = clean_text(f"{p['title']} {p['body']}")
+            upsert_posts(posts)
+            ids = row_ids([p["post_id"] for p in posts])
+            rows = [{"id": ids[p["post_id"]], "clean_text": p["clean_text"]}
+                    for p in posts if p["post_id"] in ids and p["clean_text"] and not p["is_ad"]]
+            # near-duplicates are recorded against their canonical post and never embedded
+            dup_ids = {d[0] for d in dedup_batch(rows, threshold)} if rows else set()
+            rows = [r for r in rows if r["id"] not in dup_ids]
+            if rows:
+                out_q.put((t0, rows))
+        except Exception as e:
+            failed.update(p["subreddit"] for p in posts)
+            print(f"[clean] Error: {e}")
+
+
+def embed_stage(in_q: MeteredQueue, model, model_version: str, k: int, metrics: Dict):
+    vectorizer, svd, centroids, cnt = model
+    cnt = cnt.astype(float)
+
+    while True:
+        item = in_q.get()
+        if item is STOP:
+            return
+        t0, rows = item
+        try:
+            Z = svd.transform(vectorizer.transform([r["clean_text"] for r in rows]))
+            Z = Z / (np.linalg.norm(Z, axis=1, keepdims=True) + 1e-12)
+            upsert_embedding(rows, Z, method="tfidf+svd", model_version=model_version)
+
+            # online assignment: nearest centroid by cosine, then a running-mean centroid update
+            labels = np.argmax(Z @ centroids.T, axis=1)
+            update_cluster_ids([r["id"] for r in rows], labels)
+            apply_label_deltas(model_version, k, [r["id"] for r in rows], labels)
+            for c in np.unique(labels):
+                m = labels == c
+                centroids[c] = centroids[c] * cnt[c] + Z[m].sum(axis=0)
+                cnt[c] += m.sum()
+                centroids[c] /= np.linalg.norm(centroids[c]) + 1e-12
+
+            metrics["posts"] += len(rows)
+            metrics["last_latency"] = time.time() - t0
+        except Exception as e:
+            print(f"[embed] Error: {e}")
+
+
+def monitor(queues, metrics: Dict, every: float, done: threading.Event):
+    while not done.wait(every):
+        print("[metrics] " + " | ".join(q.stats() for q in queues)
+              + f" | assigned={metrics['posts']} last_latency={metrics['last_latency']:.1f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subs", type=str, default="cybersecurity,netsec",
+                    help="comma-separated subreddits, e.g. cybersecurity,netsec,hacking")
+    ap.add_argument("--per_sub", type=int, default=200, help="max new posts per subreddit per sweep")
+    ap.add_argument("--sleep", type=float, default=1.5, help="sleep seconds between page requests")
+    ap.add_argument("--max_pages_per_sub", type=int, default=50, help="safety cap")
+    ap.add_argument("--model_version", type=str, default="tfidf_svd_v2")
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--queue_size", type=int, default=4, help="max batches buffered between stages")
+    ap.add_argument("--sweeps", type=int, default=1, help="scrape sweeps over all subs (0 = forever)")
+    ap.add_argument("--interval", type=float, default=60, help="seconds between sweeps")
+    ap.add_argument("--dedup_threshold", type=float, default=0.8, help="min estimated Jaccard to drop a duplicate")
+    ap.add_argument("--metrics_every", type=float, default=5, help="seconds between queue metrics lines")
+    args = ap.parse_args()
+
+    subs = [s.strip() for s in args.subs.split(",") if s.strip()]
+    migrate()
+
+    # transform-only: the fitted artifacts and current centroids are loaded once, up front
+    vectorizer = load(f"models/{args.model_version}_vectorizer.joblib")
+    svd = load(f"models/{args.model_version}_svd.joblib")
+    loaded = load_stored_centroids(args.model_version, args.k)
+    if loaded is None:
+        loaded = load_centroids(args.model_version, args.k)
+    if loaded is None:
+        print(f"No clusters for model_version={args.model_version} k={args.k} yet. "
+              f"Run embed.py and cluster_from_embeddings.py before starting the stream.")
+        return
+    centroids, cnt = loaded
+
+    pages_q = MeteredQueue("pages", args.queue_size)
+    rows_q = MeteredQueue("clean", args.queue_size)
+    metrics = {"posts": 0, "last_latency": 0.0}
+    done = threading.Event()
+
+    workers = [
+        threading.Thread(target=clean_stage, args=(pages_q, rows_q, args.dedup_threshold), daemon=True),
+        threading.Thread(target=embed_stage,
+                         args=(rows_q, (vectorizer, svd, centroids, cnt), args.model_version, args.k, metrics),
+                         daemon=True),
+    ]
+    for t in workers:
+        t.start()
+    threading.Thread(target=monitor, args=([pages_q, rows_q], metrics, args.metrics_every, done),
+                     daemon=True).start()
+
+    sweep = 0
+    try:
+        while args.sweeps == 0 or sweep < args.sweeps:
+            sweep += 1
+            scrape_stage(subs, args.per_sub, args.max_pages_per_sub, args.sleep, pages_q)
+            if args.sweeps == 0 or sweep < args.sweeps:
+                time.sleep(args.interval)
+    finally:
+        pages_q.put(STOP)
+        for t in workers:
+            t.join()
+        done.set()
+
+    print("[metrics] " + " | ".join(q.stats() for q in (pages_q, rows_q)))
+    print(f"Done. Streamed {metrics['posts']} posts into model_version={args.model_version}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from db import get_conn
+
+
+GRANULARITIES = ("hour", "day")
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+PREVIOUS_SQL = """
+    SELECT p.id, p.subreddit, p.created_at, l.cluster_id
+    FROM posts p
+    LEFT JOIN cluster_labels l
+      ON l.post_row_id = p.id AND l.model_version = %s AND l.k = %s
+    WHERE p.id IN ({marks})
+"""
+
+GROWTH_SQL = """
+    SELECT cluster_id,
+           SUM(CASE WHEN bucket_start >= %s THEN n ELSE 0 END) AS cur_n,
+           SUM(CASE WHEN bucket_start < %s THEN n ELSE 0 END) AS prev_n
+    FROM cluster_trends
+    WHERE model_version=%s AND k=%s AND granularity=%s
+      AND bucket_start >= %s AND bucket_start < %s
+"""
+
+
+def load_previous(model_version: str, k: int, ids: List[int]):
+    out = []
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    for i in range(0, len(ids), 1000):
+        chunk = ids[i:i + 1000]
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(PREVIOUS_SQL.format(marks=marks), [model_version, k] + chunk)
+        out.extend(cur.fetchall())
+    cur.close()
+    conn.close()
+    return out
+
+
+def apply_label_deltas(model_version: str, k: int, ids, labels) -> int:
+    # fold only the posts whose label changed into the aggregates: -1 on the old cluster, +1 on the new
+    new_label = {int(pid): int(lab) for pid, lab in zip(ids, labels)}
+    prev = load_previous(model_version, k, list(new_label))
+
+    deltas: Dict[Tuple, int] = {}
+    changed = []
+    for r in prev:
+        pid = int(r["id"])
+        old = r["cluster_id"]
+        new = new_label[pid]
+        if old is not None and int(old) == new:
+            continue
+        changed.append((model_version, k, pid, new))
+        if r["created_at"] is None:
+            continue
+        sub = r["subreddit"] or ""
+        for g in GRANULARITIES:
+            b = bucket_start(r["created_at"], g)
+            if old is not None:
+                key = (g, sub, b, int(old))
+                deltas[key] = deltas.get(key, 0) - 1
+            key = (g, sub, b, new)
+            deltas[key] = deltas.get(key, 0) + 1
+
+    if not changed:
+        return 0
+
+    conn = get_conn()
+    cur = conn.cursor()
+    rows = [(model_version, k, g, sub, b, c, d) for (g, sub, b, c), d in deltas.items() if d != 0]
+    if rows:
+        cur.executemany("""
+            INSERT INTO cluster_trends (model_version, k, granularity, subreddit, bucket_start, cluster_id, n)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE n = n + VALUES(n)
+        """, rows)
+    cur.executemany("""
+        INSERT INTO cluster_labels (model_version, k, post_row_id, cluster_id)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE cluster_id=VALUES(cluster_id)
+    """, changed)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return len(changed)
+
+
+def growth_ranking(model_version: str, k: int, granularity: str, window: int,
+                   subreddit: Optional[str] = None, until: Optional[datetime] = None):
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+
+    if until is None:
+        cur.execute("""
+            SELECT MAX(bucket_start) AS latest
+            FROM cluster_trends
+            WHERE model_version=%s AND k=%s AND granularity=%s
+        """, (model_version, k, granularity))
+        latest = cur.fetchone()["latest"]
+        if latest is None:
+            cur.close()
+            conn.close()
+            return [], None
+        step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+        until = latest + step
+
+    span = timedelta(hours=window) if granularity == "hour" else timedelta(days=window)
+    mid = until - span
+    start = mid - span
+
+    sql = GROWTH_SQL
+    params = [mid, mid, model_version, k, granularity, start, until]
+    if subreddit:
+        sql += " AND subreddit=%s"
+        params.append(subreddit)
+    sql += " GROUP BY cluster_id"
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    out = []
+    for r in rows:
+        cur_n, prev_n = int(r["cur_n"] or 0), int(r["prev_n"] or 0)
+        out.append({
+            "cluster_id": int(r["cluster_id"]),
+            "cur": cur_n,
+            "prev": prev_n,
+            "growth": (cur_n - prev_n) / max(prev_n, 1),
+        })
+    out.sort(key=lambda x: (x["growth"], x["cur"]), reverse=True)
+    return out, (start, mid, until)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model_version", type=str, default="tfidf_svd_v2")
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--granularity", choices=GRANULARITIES, default="day")
+    ap.add_argument("--window", type=int, default=7, help="window length in granularity units")
+    ap.add_argument("--subreddit", type=str, default=None, help="restrict to one subreddit")
+    ap.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    ranking, span = growth_ranking(args.model_version, args.k, args.granularity, args.window, args.subreddit)
+    if not ranking:
+        print("No trend data yet. Run cluster_from_embeddings.py first.")
+        return
+
+    start, mid, until = span
+    where = f"r/{args.subreddit}" if args.subreddit else "all subreddits"
+    print(f"Cluster growth in {where}: [{mid} .. {until}) vs [{start} .. {mid})")
+    for i, r in enumerate(ranking[:args.top], 1):
+        print(f"{i}. cluster {r['cluster_id']}: {r['prev']} -> {r['cur']} ({r['growth']:+.0%})")
+
+
+if __name__ == "__main__":
+    main()
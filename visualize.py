@@ -4,27 +4,31 @@ import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 from db import get_conn
+from snapshot import load_snapshot
+from query import CENTROIDS_SQL
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--model_version", type=str, default="tfidf_svd_v2")
     ap.add_argument("--out", type=str, default="cluster_pca.png")
+    ap.add_argument("--snapshot", type=str, default=None, help="read embeddings from a snapshot instead of MySQL")
     args = ap.parse_args()
 
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT e.vector_json, p.cluster_id
-        FROM embeddings e
-        JOIN posts p ON p.id = e.post_row_id
-        WHERE e.model_version = %s AND p.cluster_id IS NOT NULL
-    """, (args.model_version,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    if args.snapshot:
+        snap = load_snapshot(args.snapshot, model_version=args.model_version)
+        keep = np.where(snap["cluster_id"] >= 0)[0]
+        X = snap["embedding"][keep]
+        y = np.asarray(snap["cluster_id"][keep], dtype=int)
+    else:
+        conn = get_conn()
+        cur = conn.cursor(dictionary=True)
+        cur.execute(CENTROIDS_SQL, (args.model_version,))
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
 
-    X = np.array([json.loads(r["vector_json"]) for r in rows], dtype=float)
-    y = np.array([int(r["cluster_id"]) for r in rows], dtype=int)
+        X = np.array([json.loads(r["vector_json"]) for r in rows], dtype=float)
+        y = np.array([int(r["cluster_id"]) for r in rows], dtype=int)
 
     Z = PCA(n_components=2, random_state=42).fit_transform(X)
 